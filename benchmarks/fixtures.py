@@ -0,0 +1,126 @@
+import functools
+import http.server
+import os
+import random
+import textwrap
+import threading
+from typing import Dict, List, Tuple
+
+# Deterministic fixture PDFs for the benchmarks, written with a minimal PDF
+# generator (standard Helvetica font, one text object per page) so no PDF
+# library beyond pdfplumber is needed, and a local HTTP server to serve them.
+
+SERVICES = [
+    "Joint replacements", "Pregnancy and birth", "Heart and vascular system", "Lung and chest",
+    "Kidney and bladder", "Dental surgery", "Cataracts", "Rehabilitation", "Palliative care",
+    "Psychiatric services", "Sleep studies", "Back, neck and spine", "Hernia and appendix",
+    "Assisted reproductive services", "Weight loss surgery", "Eye (not cataracts)"
+]
+STATUSES = ["Included", "Restricted", "Excluded"]
+
+_SENTENCES = [
+    "You can choose to be treated as a private patient in a public or private hospital.",
+    "Waiting periods apply to pre-existing conditions and are explained in the policy terms.",
+    "Benefits are paid for services listed as included once the relevant waiting period has been served.",
+    "Restricted services are covered at the minimum benefit set by the government for shared ward accommodation.",
+    "An excess is the amount you agree to pay towards the cost of a hospital admission.",
+    "Members have access to a network of agreement hospitals where out-of-pocket costs are reduced.",
+    "Extras benefits are subject to annual limits that reset at the start of each calendar year.",
+    "Item {item} is paid at {percent}% of the fee up to the annual limit.",
+    "Claims must be lodged within two years of the date of service.",
+    "Ambulance cover includes emergency transport when it is medically necessary."
+]
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    text = []
+    for _ in range(sentences):
+        text.append(rng.choice(_SENTENCES).format(item=rng.randint(10000, 99999), percent=rng.choice([50, 60, 70, 80])))
+    return " ".join(text)
+
+
+def product_pages(page_count: int, seed: int = 0) -> List[List[str]]:
+    """
+    Builds the text lines of a product document: per page a header, a section
+    heading, wrapped paragraphs, a service list, a benefit table and a footer.
+    """
+    rng = random.Random(seed)
+    pages = []
+    for page_number in range(1, page_count + 1):
+        lines = ["Example Health Fund", f"Product Summary {seed}", ""]
+        for section in range(2):
+            lines.append(rng.choice(["Hospital cover", "Extras cover", "What's covered", "Waiting periods", "Limits and excesses"]))
+            lines.extend(textwrap.wrap(_paragraph(rng, rng.randint(3, 6)), 95))
+            lines.append("")
+            for service in rng.sample(SERVICES, 5):
+                lines.append(f"- {service}: {rng.choice(STATUSES)}")
+            lines.append("")
+            lines.append(f"Excess per admission ${rng.choice([250, 500, 750])} ${rng.choice([500, 1000, 1500])}")
+            lines.append(f"Annual limit ${rng.randint(3, 20) * 100} {rng.choice([60, 70, 80])}%")
+            lines.append("")
+        lines.append(f"Page {page_number} of {page_count}")
+        pages.append(lines)
+    return pages
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Writes a PDF with one page per list of text lines."""
+    # Object ids: 1 catalog, 2 page tree, 3 font, then a (page, content stream) pair per page.
+    objects: Dict[int, bytes] = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    }
+    page_ids = []
+    for i, lines in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        page_ids.append(page_id)
+        text = "".join(f"({_escape(line)}) Tj T* " for line in lines)
+        stream = f"BT /F1 9 Tf 12 TL 40 800 Td {text}ET".encode("latin-1", "replace")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[2] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b"%d 0 obj\n%s\nendobj\n" % (object_id, objects[object_id])
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b"%010d 00000 n \n" % offsets[object_id]
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def write_fixtures(directory: str, page_counts: List[int]) -> Dict[int, str]:
+    """Writes one product PDF per page count into `directory` and returns their file names."""
+    os.makedirs(directory, exist_ok=True)
+    names = {}
+    for page_count in page_counts:
+        name = f"product_{page_count}p.pdf"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(make_pdf(product_pages(page_count, seed=page_count)))
+        names[page_count] = name
+    return names
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory: str) -> Tuple[http.server.ThreadingHTTPServer, str]:
+    """Serves `directory` over HTTP on a free local port, from a daemon thread."""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,300 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, AsyncGenerator, Dict, List
+
+import numpy as np
+
+# Offline benchmark of the RAG pipeline and the agent turn loop:
+#
+#   1. ingestion   `ingestion.build_document` over fixture PDFs of several sizes (pages/s, chunks/s)
+#   2. answers     `answer_from_product_document` latency percentiles, per retrieval mode,
+#                  for first-time and repeated questions
+#   3. sessions    concurrent sessions driven through `Runner.run_async` (turns/s, turn latency)
+#
+# Fixture PDFs are generated locally and served over a local HTTP server, and
+# `gemini-2.0-flash` is replaced by a scripted stub LLM, so runs need no network
+# access or API key and are comparable between machines and commits. Tool and
+# turn timings come from the agent's own tracing spans.
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+QUESTIONS = [
+    "Are joint replacements covered?",
+    "What is the excess per admission?",
+    "How long do I have to lodge a claim?",
+    "Is pregnancy and birth included?",
+    "What is the annual limit?",
+    "Does the policy cover emergency ambulance transport?",
+    "What percentage of the fee is paid for item 22010?",
+    "Are there waiting periods for pre-existing conditions?"
+]
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": max(values)
+    }
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _make_stub_llm(latency_ms: float):
+    """
+    Builds a scripted stand-in for the Gemini model. Each benchmark user message
+    is a JSON object naming the tool to call and its arguments; once the tool's
+    response comes back, the stub answers with a short final text.
+    """
+    from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+    from google.genai import types
+
+    class StubLlm(BaseLlm):
+        latency_ms: float = 0.0
+
+        async def generate_content_async(
+            self, llm_request: LlmRequest, stream: bool = False
+        ) -> AsyncGenerator[LlmResponse, None]:
+            if self.latency_ms:
+                await asyncio.sleep(self.latency_ms / 1000)
+            last = llm_request.contents[-1]
+            responses = [part.function_response for part in last.parts if part.function_response]
+            if responses:
+                text = f"Done: {json.dumps(responses[0].response)[:200]}"
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+                return
+
+            script = json.loads(last.parts[0].text)
+            call = types.FunctionCall(name=script["tool"], args=script["args"])
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+
+    return StubLlm(model="stub-gemini-2.0-flash", latency_ms=latency_ms)
+
+
+def bench_ingestion(fixture_dir: str, fixtures_by_pages: Dict[int, str], repeats: int) -> List[Dict[str, Any]]:
+    from health_insurance_agent import index_factory, ingestion, rag_store
+
+    rows = []
+    for pages, name in sorted(fixtures_by_pages.items()):
+        with open(os.path.join(fixture_dir, name), "rb") as f:
+            pdf_bytes = f.read()
+        seconds = []
+        chunks = 0
+        for _ in range(repeats):
+            started = time.perf_counter()
+            _, built_chunks, built_embeddings, index = ingestion.build_document(pdf_bytes)
+            seconds.append(time.perf_counter() - started)
+            chunks = len(built_chunks)
+            document = {"chunks": built_chunks, "embeddings": built_embeddings, "index": index}
+        median = statistics.median(seconds)
+        rows.append({
+            "pages": pages,
+            "pdf_bytes": len(pdf_bytes),
+            "chunks": chunks,
+            "seconds_median": median,
+            "seconds_min": min(seconds),
+            "pages_per_second": pages / median,
+            "chunks_per_second": chunks / median,
+            "index_bytes": index_factory.vector_bytes(index),
+            "document_bytes": rag_store.estimate_document_bytes(document)
+        })
+        print(f"ingestion {pages:>4} pages: {median:.2f}s, {pages / median:.1f} pages/s, {chunks / median:.1f} chunks/s")
+    return rows
+
+
+async def _turn(runner, session_id: str, tool: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    from google.genai import types
+    from health_insurance_agent import tracing
+
+    content = types.Content(role="user", parts=[types.Part(text=json.dumps({"tool": tool, "args": args}))])
+    with tracing.span(tracing.TURN_SPAN, session_id=session_id) as turn:
+        async for _ in runner.run_async(user_id="bench", session_id=session_id, new_message=content):
+            pass
+    summary = turn.summary or {"duration_ms": 0.0, "spans": {}}
+    return {"turn_ms": summary["duration_ms"], "tool_ms": summary["spans"].get(f"tool.{tool}", {}).get("total_ms", 0.0)}
+
+
+async def _new_session(runner, session_id: str) -> None:
+    await runner.session_service.create_session(app_name=runner.app_name, user_id="bench", session_id=session_id)
+
+
+async def bench_answers(runner, pdf_url: str, rounds: int) -> Dict[str, Any]:
+    """Measures `answer_from_product_document` per retrieval mode, for new and repeated questions."""
+    from health_insurance_agent.answer_cache import answer_cache
+
+    session_id = "bench-answers"
+    await _new_session(runner, session_id)
+    await _turn(runner, session_id, "process_product_document", {"pdf_url": pdf_url})
+
+    results = {}
+    for mode in ("dense", "sparse", "hybrid"):
+        first, repeated = [], []
+        for _ in range(rounds):
+            # Each round asks every question twice: after clearing the answer cache, then again.
+            answer_cache.clear()
+            for timings in (first, repeated):
+                for question in QUESTIONS:
+                    timing = await _turn(
+                        runner, session_id, "answer_from_product_document",
+                        {"user_question": question, "retrieval_mode": mode}
+                    )
+                    timings.append(timing["tool_ms"])
+        results[mode] = {"first_asked": _percentiles(first), "repeated": _percentiles(repeated)}
+        print(
+            f"answers {mode:>6}: first p50 {results[mode]['first_asked']['p50_ms']:.1f}ms "
+            f"p95 {results[mode]['first_asked']['p95_ms']:.1f}ms, repeated p50 {results[mode]['repeated']['p50_ms']:.1f}ms"
+        )
+    results["answer_cache"] = answer_cache.stats()
+    return results
+
+
+async def bench_sessions(runner, pdf_urls: List[str], levels: List[int], questions: int) -> List[Dict[str, Any]]:
+    """Runs `level` concurrent sessions, each processing a PDF and asking `questions` questions."""
+    rows = []
+    for level in levels:
+        turn_ms: List[float] = []
+
+        async def session(i: int) -> None:
+            session_id = f"bench-{level}-{i}"
+            await _new_session(runner, session_id)
+            timing = await _turn(runner, session_id, "process_product_document", {"pdf_url": pdf_urls[i % len(pdf_urls)]})
+            turn_ms.append(timing["turn_ms"])
+            for q in range(questions):
+                question = QUESTIONS[(i + q) % len(QUESTIONS)]
+                timing = await _turn(runner, session_id, "answer_from_product_document", {"user_question": question})
+                turn_ms.append(timing["turn_ms"])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(session(i) for i in range(level)))
+        wall = time.perf_counter() - started
+        rows.append({
+            "sessions": level,
+            "turns": len(turn_ms),
+            "wall_seconds": wall,
+            "turns_per_second": len(turn_ms) / wall,
+            "turn_latency": _percentiles(turn_ms),
+            "peak_rss_mb": _peak_rss_mb()
+        })
+        print(f"sessions {level:>3}: {len(turn_ms) / wall:.1f} turns/s, p95 turn {rows[-1]['turn_latency']['p95_ms']:.1f}ms")
+    return rows
+
+
+async def run(args: argparse.Namespace, work_dir: str) -> Dict[str, Any]:
+    import fixtures
+
+    fixture_dir = os.path.join(work_dir, "fixtures")
+    fixtures_by_pages = fixtures.write_fixtures(fixture_dir, args.pages)
+    server, base_url = fixtures.serve_directory(fixture_dir)
+    pdf_urls = [f"{base_url}/{name}" for _, name in sorted(fixtures_by_pages.items())]
+
+    from google.adk.runners import Runner
+    from health_insurance_agent import agent, chunking, embeddings, index_factory, ingestion, retrieval
+    from health_insurance_agent.session_store import SqliteSessionService
+
+    memory = {"baseline_rss_mb": _peak_rss_mb()}
+    started = time.perf_counter()
+    embeddings.warm_up()
+    model_load_seconds = time.perf_counter() - started
+    memory["after_model_load_rss_mb"] = _peak_rss_mb()
+
+    ingestion_rows = bench_ingestion(fixture_dir, fixtures_by_pages, args.repeats)
+    memory["after_ingestion_rss_mb"] = _peak_rss_mb()
+
+    bench_agent = agent.root_agent.model_copy(update={"model": _make_stub_llm(args.llm_latency_ms)})
+    session_service = SqliteSessionService(db_path=os.path.join(work_dir, "sessions.sqlite3"))
+    runner = Runner(agent=bench_agent, app_name="rag-benchmark", session_service=session_service)
+
+    answers = await bench_answers(runner, pdf_urls[0], args.rounds)
+    memory["after_answers_rss_mb"] = _peak_rss_mb()
+    sessions = await bench_sessions(runner, pdf_urls, args.sessions, args.questions)
+    memory["after_sessions_rss_mb"] = _peak_rss_mb()
+    memory["document_store"] = agent.document_store.stats()
+    await session_service.flush()
+    memory["session_store"] = session_service.stats()
+    session_service.close()
+    server.shutdown()
+
+    return {
+        "environment": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time()
+        },
+        "config": {
+            "cache_variant": ingestion.CACHE_VARIANT,
+            "index": index_factory.index_variant(),
+            "chunking": chunking.chunker_variant(),
+            "retrieval_mode": retrieval.RETRIEVAL_MODE,
+            "retrieval_k": retrieval.RETRIEVAL_K,
+            "llm_latency_ms": args.llm_latency_ms
+        },
+        "model_load_seconds": model_load_seconds,
+        "ingestion": ingestion_rows,
+        "answers": answers,
+        "sessions": sessions,
+        "memory": memory
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the RAG pipeline and agent turn loop.")
+    parser.add_argument("--pages", type=_int_list, default=[10, 50, 200], help="Fixture PDF sizes, in pages")
+    parser.add_argument("--repeats", type=int, default=3, help="Ingestion runs per fixture")
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds of the question set per retrieval mode")
+    parser.add_argument("--sessions", type=_int_list, default=[1, 4, 16], help="Concurrent session counts")
+    parser.add_argument("--questions", type=int, default=5, help="Questions asked per concurrent session")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each stub LLM call")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="rag-benchmark-") as work_dir:
+        # Isolate the run from the real document cache and product corpus. These are
+        # read when the agent modules are imported, so they are set before that.
+        os.environ["RAG_CACHE_DIR"] = os.path.join(work_dir, "cache")
+        os.environ["RAG_CORPUS_DIR"] = os.path.join(work_dir, "corpus")
+        # Tool and turn timings are read from the tracing spans.
+        os.environ["RAG_TRACING"] = "1"
+        results = asyncio.run(run(args, work_dir))
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+# Load test of the multi-worker serving mode (`health_insurance_agent/serving.py`).
+#
+# For each worker count, a fixed set of concurrent sessions is pushed through a
+# `WorkerPool`: every session processes its own fixture PDF (extraction, chunking,
+# embedding and indexing, the CPU-bound part of a conversation) and then asks a
+# few questions. Turns run through `Runner.run_async` with the scripted stub LLM
+# from `rag_benchmark.py`, and sessions are stored in a SQLite session database
+# shared by the workers. Reported per worker count: turns/s, speedup and scaling
+# efficiency relative to one worker, turn latency, and the workers' resident and
+# proportional (shared pages split between processes) memory.
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, benchmarks_dir)
+
+import rag_benchmark  # noqa: E402  (also puts the project root on sys.path)
+
+# Set in each worker by its initializer.
+_runner = None
+
+
+async def _turn_handler(message: str, session_id: str):
+    """Serving handler: runs one stub-LLM turn and yields the final response text."""
+    from google.adk.sessions.base_session_service import GetSessionConfig
+    from google.genai import types
+
+    session_service = _runner.session_service
+    existing = await session_service.get_session(
+        app_name=_runner.app_name, user_id="bench", session_id=session_id,
+        config=GetSessionConfig(num_recent_events=0)
+    )
+    if existing is None:
+        await session_service.create_session(app_name=_runner.app_name, user_id="bench", session_id=session_id)
+
+    text = ""
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+    async for event in _runner.run_async(user_id="bench", session_id=session_id, new_message=content):
+        if event.is_final_response() and event.content and event.content.parts:
+            text = event.content.parts[0].text or ""
+    yield text
+
+
+def _worker_initializer(cache_dir: str, db_path: str, llm_latency_ms: float):
+    def initialize() -> None:
+        global _runner
+        from google.adk.runners import Runner
+        from health_insurance_agent import agent, document_cache
+        from health_insurance_agent.session_store import SqliteSessionService
+
+        # Each worker count starts from an empty document cache, so every PDF is processed.
+        document_cache.CACHE_DIR = cache_dir
+        bench_agent = agent.root_agent.model_copy(update={"model": rag_benchmark._make_stub_llm(llm_latency_ms)})
+        _runner = Runner(
+            agent=bench_agent, app_name="serving-benchmark", session_service=SqliteSessionService(db_path=db_path)
+        )
+    return initialize
+
+
+def _process_memory_mb(pid: int) -> Optional[Dict[str, float]]:
+    """Resident and proportional set size of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r", encoding="utf-8") as f:
+            # The first line describes the rolled-up address range; the rest are "Field:   123 kB".
+            fields = dict(line.split(":", 1) for line in f.readlines()[1:] if ":" in line)
+    except OSError:
+        return None
+    kb = {key: int(value.split()[0]) for key, value in fields.items() if value.strip().endswith("kB")}
+    return {"rss_mb": kb.get("Rss", 0) / 1024, "pss_mb": kb.get("Pss", 0) / 1024}
+
+
+async def _session(pool, session_id: str, pdf_url: str, questions: int, turn_ms: List[float]) -> None:
+    messages = [{"tool": "process_product_document", "args": {"pdf_url": pdf_url}}]
+    for q in range(questions):
+        question = rag_benchmark.QUESTIONS[q % len(rag_benchmark.QUESTIONS)]
+        messages.append({"tool": "answer_from_product_document", "args": {"user_question": question}})
+    for message in messages:
+        started = time.perf_counter()
+        async for _ in pool.submit(session_id, json.dumps(message)):
+            pass
+        turn_ms.append((time.perf_counter() - started) * 1000)
+
+
+async def bench_workers(pool, pdf_urls: List[str], level: int, questions: int) -> Dict[str, Any]:
+    turn_ms: List[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _session(pool, f"serve-{level}-{i}", pdf_url, questions, turn_ms) for i, pdf_url in enumerate(pdf_urls)
+    ))
+    wall = time.perf_counter() - started
+    workers_memory = [memory for memory in map(_process_memory_mb, pool.pids) if memory is not None]
+    return {
+        "workers": level,
+        "sessions": len(pdf_urls),
+        "turns": len(turn_ms),
+        "wall_seconds": wall,
+        "turns_per_second": len(turn_ms) / wall,
+        "turn_latency": rag_benchmark._percentiles(turn_ms),
+        "workers_rss_mb": sum(memory["rss_mb"] for memory in workers_memory) if workers_memory else None,
+        "workers_pss_mb": sum(memory["pss_mb"] for memory in workers_memory) if workers_memory else None
+    }
+
+
+def run(args: argparse.Namespace, work_dir: str) -> Dict[str, Any]:
+    import fixtures
+    from health_insurance_agent import serving
+
+    fixture_dir = os.path.join(work_dir, "fixtures")
+    os.makedirs(fixture_dir)
+    names = []
+    for i in range(args.sessions):
+        # A distinct document per session, so no session reuses another's processing.
+        name = f"product_s{i}.pdf"
+        with open(os.path.join(fixture_dir, name), "wb") as f:
+            f.write(fixtures.make_pdf(fixtures.product_pages(args.pages, seed=1000 + i)))
+        names.append(name)
+    server, base_url = fixtures.serve_directory(fixture_dir)
+
+    rows = []
+    for level in args.workers:
+        pdf_urls = [f"{base_url}/{name}" for name in names]
+        pool = serving.WorkerPool(
+            _turn_handler,
+            level,
+            initializer=_worker_initializer(
+                os.path.join(work_dir, f"cache-{level}"), os.path.join(work_dir, "sessions.sqlite3"), args.llm_latency_ms
+            )
+        )
+        pool.start()
+        try:
+            row = asyncio.run(bench_workers(pool, pdf_urls, level, args.questions))
+        finally:
+            pool.stop()
+        baseline = rows[0]["turns_per_second"] / rows[0]["workers"] if rows else row["turns_per_second"] / level
+        row["speedup"] = row["turns_per_second"] / baseline
+        row["efficiency"] = row["speedup"] / level
+        rows.append(row)
+        print(
+            f"workers {level:>2}: {row['turns_per_second']:.1f} turns/s, speedup {row['speedup']:.2f}x "
+            f"({row['efficiency']:.0%}), p95 turn {row['turn_latency']['p95_ms']:.0f}ms"
+        )
+    server.shutdown()
+
+    return {
+        "environment": {
+            "commit": rag_benchmark._git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time()
+        },
+        "config": {
+            "pages": args.pages,
+            "sessions": args.sessions,
+            "questions": args.questions,
+            "llm_latency_ms": args.llm_latency_ms
+        },
+        "results": rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the multi-worker serving mode.")
+    parser.add_argument(
+        "--workers", type=rag_benchmark._int_list, default=[1, 2, 4], help="Worker counts; the first is the baseline"
+    )
+    parser.add_argument("--sessions", type=int, default=16, help="Concurrent sessions, each with its own PDF")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per fixture PDF")
+    parser.add_argument("--questions", type=int, default=3, help="Questions asked per session")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each stub LLM call")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="serving-benchmark-") as work_dir:
+        # Isolate the run from the real cache and corpus; everything else is the
+        # production worker configuration.
+        os.environ["RAG_CACHE_DIR"] = os.path.join(work_dir, "cache")
+        os.environ["RAG_CORPUS_DIR"] = os.path.join(work_dir, "corpus")
+        results = run(args, work_dir)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
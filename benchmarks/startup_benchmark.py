@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Measures how long `import health_insurance_agent.agent` takes in a fresh
+# interpreter, on top of the unavoidable cost of importing Google ADK itself,
+# and checks that no heavy RAG dependency is imported eagerly.
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "faiss", "pdfplumber"]
+
+_MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(statement, runs):
+    """Runs the import `statement` in `runs` fresh interpreters and returns the timings and heavy modules loaded."""
+    seconds = []
+    loaded = set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _MEASURE.format(statement=statement, heavy=HEAVY_MODULES)],
+            cwd=project_root,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        loaded.update(result["loaded"])
+    return seconds, sorted(loaded)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup (import time) benchmark for the health insurance agent.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=float(os.environ.get("AGENT_IMPORT_BUDGET_SECONDS", 0.5)),
+        help="Allowed import time of the agent on top of Google ADK, in seconds"
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    # `google.adk.agents` loads its members lazily, so import what agent.py actually uses.
+    baseline, _ = time_import("from google.adk.agents import Agent", args.runs)
+    agent, loaded = time_import("import health_insurance_agent.agent", args.runs)
+    overhead = statistics.median(agent) - statistics.median(baseline)
+
+    results = {
+        "runs": args.runs,
+        "adk_import_seconds_median": statistics.median(baseline),
+        "agent_import_seconds_median": statistics.median(agent),
+        "agent_overhead_seconds": overhead,
+        "budget_seconds": args.budget,
+        "heavy_modules_loaded": loaded,
+        "within_budget": overhead <= args.budget and not loaded
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if loaded:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(loaded)}")
+    if overhead > args.budget:
+        print(f"FAIL: agent import overhead {overhead:.3f}s exceeds budget {args.budget:.3f}s")
+    sys.exit(0 if results["within_budget"] else 1)
+
+
+if __name__ == "__main__":
+    main()
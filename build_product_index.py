@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import json
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+# Construct the path to the .env file
+project_root = os.path.dirname(os.path.abspath(__file__))
+dotenv_path = os.path.join(project_root, 'health_insurance_agent', '.env')
+
+# Load the .env file (it may override RAG_CORPUS_DIR / RAG_CACHE_DIR)
+load_dotenv(dotenv_path=dotenv_path)
+
+from health_insurance_agent import catalogue, corpus_index, index_factory
+
+def write_index_report(corpus_dir, report_path, num_queries, k):
+    """Writes a recall-vs-latency comparison of every index type over the built corpus."""
+    embeddings = corpus_index.CorpusIndex(corpus_dir).load_embeddings()
+
+    # Queries are perturbed copies of corpus vectors, so each has near neighbours like a real question would.
+    rng = np.random.default_rng(0)
+    sample = embeddings[rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)]
+    queries = sample + rng.normal(scale=0.05, size=sample.shape).astype(np.float32)
+
+    rows = index_factory.recall_latency_report(embeddings, queries, k=k)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"vectors": len(embeddings), "queries": len(queries), "k": k, "results": rows}, f, indent=2)
+
+    print(f"\nIndex report over {len(embeddings)} vectors, {len(queries)} queries (written to {report_path}):")
+    print(f"{'index':<8}{'param':<14}{'recall@' + str(k):>10}{'p50 ms':>10}{'p95 ms':>10}{'size KB':>10}")
+    for row in rows:
+        if "error" in row:
+            print(f"{row['index_type']:<8}error: {row['error']}")
+            continue
+        param = f"{row['param']}={row['value']}" if row["param"] else "-"
+        print(
+            f"{row['index_type']:<8}{param:<14}{row[f'recall_at_{k}']:>10.3f}"
+            f"{row['latency_ms_p50']:>10.3f}{row['latency_ms_p95']:>10.3f}{row['size_bytes'] / 1024:>10.1f}"
+        )
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Pre-build the product corpus index from every product PDF in the catalogue."
+    )
+    parser.add_argument(
+        "--output",
+        default=corpus_index.CORPUS_DIR,
+        help=f"Directory to write the corpus to (default: {corpus_index.CORPUS_DIR})"
+    )
+    parser.add_argument(
+        "--report",
+        metavar="PATH",
+        help="Also write a recall-vs-latency report comparing the index types to this JSON file"
+    )
+    parser.add_argument("--skip-build", action="store_true", help="Only write the report for an existing corpus")
+    parser.add_argument("--report-queries", type=int, default=200, help="Number of queries used by the report")
+    parser.add_argument("--report-k", type=int, default=3, help="k used for recall@k in the report")
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        manifest = await corpus_index.build_corpus(catalogue.get_catalogue().products, args.output)
+        print(
+            f"Built corpus in {args.output}: {len(manifest['products'])} products, "
+            f"{len(manifest['shards'])} shards."
+        )
+
+    if args.report:
+        write_index_report(args.output, args.report, args.report_queries, args.report_k)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,3 @@
-import gradio as gr
 import uuid
 import os
 from dotenv import load_dotenv
@@ -12,69 +11,167 @@ dotenv_path = os.path.join(project_root, 'health_insurance_agent', '.env')
 load_dotenv(dotenv_path=dotenv_path)
 # -------------------------
 
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
 from google.genai import types
-from health_insurance_agent import agent
+from health_insurance_agent import agent, embeddings, serving, tracing
+from health_insurance_agent.session_store import SqliteSessionService
 
 # --- ADK Setup ---
 # Create a single, shared session service and runner instance for the Gradio app.
+# Sessions are kept in SQLite (see session_store.py), so memory stays flat as
+# sessions accumulate and several app processes can share them.
 APP_NAME = "Health Insurance Agent"
-session_service = InMemorySessionService()
-health_insurance_runner = Runner(
-    agent=agent.root_agent, 
-    app_name=APP_NAME, 
-    session_service=session_service
-)
+session_service = None
+health_insurance_runner = None
+
+def init_runner():
+    """Creates the session service and runner. With serving workers, each worker creates its own."""
+    global session_service, health_insurance_runner
+    session_service = SqliteSessionService()
+    health_insurance_runner = Runner(
+        agent=agent.root_agent,
+        app_name=APP_NAME,
+        session_service=session_service
+    )
+
+# With RAG_SERVING_WORKERS > 1, turns run in forked worker processes instead (see serving.py).
+worker_pool = None
 # -----------------
 
-# Keep track of created sessions to avoid creating them more than once.
-created_sessions = set()
+# Stream the model's answer as it is generated instead of waiting for the whole response.
+STREAMING_RUN_CONFIG = RunConfig(streaming_mode=StreamingMode.SSE)
+
+# Shown under the partial answer while a tool runs.
+TOOL_STATUS_MESSAGES = {
+    "get_health_insurance_products": "Finding matching products…",
+    "process_product_document": "Processing the product PDF…",
+    "answer_from_product_document": "Searching the product document…"
+}
+
+# Enough to tell whether a session exists without loading its history.
+_SESSION_EXISTS_CONFIG = GetSessionConfig(num_recent_events=0)
+
+def _event_text(event) -> str:
+    """Returns the visible text of an event, skipping the model's thoughts."""
+    return "".join(part.text for part in event.content.parts if part.text and not getattr(part, "thought", False))
 
 async def process_message(message: str, history: list, session_id: str):
-    """Processes a user's message using the shared ADK runner."""
+    """
+    Processes a user's message using the shared ADK runner, yielding the response
+    so far each time more of it is generated or a tool starts running.
+    """
     user_id = "gradio_user"  # Static user ID for all Gradio sessions for simplicity
 
     try:
-        # Evidence-based fix: Create the session if it's the first time we've seen this ID.
-        if session_id not in created_sessions:
+        # Create the session if it's the first time we've seen this ID (or it has expired).
+        existing = await session_service.get_session(
+            app_name=APP_NAME,
+            user_id=user_id,
+            session_id=session_id,
+            config=_SESSION_EXISTS_CONFIG
+        )
+        if existing is None:
             await session_service.create_session(
                 app_name=APP_NAME,
                 user_id=user_id,
                 session_id=session_id
             )
-            created_sessions.add(session_id)
 
-        # Now, process the user's message.
-        full_response = ""
+        # Now, process the user's message, tracing the whole turn.
+        full_response = ""  # Text of the model's completed messages in this turn
+        streamed = ""       # Text streamed so far for the message being generated
         content = types.Content(role="user", parts=[types.Part(text=message)])
-        async for event in health_insurance_runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
-            if event.is_final_response() and event.content and event.content.parts:
-                full_response += event.content.parts[0].text
-        return full_response
+        with tracing.span(tracing.TURN_SPAN, session_id=session_id, message_chars=len(message)) as turn:
+            async for event in health_insurance_runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=content,
+                run_config=STREAMING_RUN_CONFIG
+            ):
+                if not event.content or not event.content.parts:
+                    continue
+
+                function_calls = event.get_function_calls()
+                if function_calls:
+                    status = TOOL_STATUS_MESSAGES.get(function_calls[0].name, "Working on it…")
+                    yield f"{full_response}\n\n_{status}_".lstrip()
+                    continue
+                if event.get_function_responses():
+                    continue
+
+                text = _event_text(event)
+                if not text:
+                    continue
+                if "first_token_ms" not in turn.attributes:
+                    turn.set_attribute("first_token_ms", turn.duration_ms)
+                if event.partial:
+                    streamed += text
+                    yield f"{full_response}\n\n{streamed}".lstrip()
+                else:
+                    # The final, non-partial event repeats the whole message that was streamed.
+                    full_response = f"{full_response}\n\n{text}".lstrip()
+                    streamed = ""
+                    yield full_response
+            turn.set_attribute("response_chars", len(full_response))
+        if turn.summary is not None:
+            print(tracing.format_summary(turn.summary))
     except Exception as e:
-        return f"An error occurred: {e}"
+        # Never write the events of a half-finished turn.
+        session_service.discard_pending(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        yield f"An error occurred: {e}"
+
+def worker_turn(message: str, session_id: str):
+    """Runs a turn inside a serving worker; the conversation history is in the session."""
+    return process_message(message, [], session_id)
 
 async def chat_interface_fn(message, history, session_id_state):
-    """Wrapper function for Gradio's ChatInterface."""
+    """Wrapper function for Gradio's ChatInterface, streaming the response as it is generated."""
     session_id = session_id_state if session_id_state else str(uuid.uuid4())
-    response = await process_message(message, history, session_id)
-    return response
-
-with gr.Blocks() as demo:
-    gr.Markdown("# Health Insurance Agent")
-    session_id_state = gr.State(str(uuid.uuid4()))
-
-    gr.ChatInterface(
-        fn=chat_interface_fn,
-        additional_inputs=[session_id_state],
-        title="Health Insurance Chatbot",
-        description="Ask me about health insurance products!",
-        examples=[
-            ["I need hospital cover for my family"],
-            ["What extras products do you have?"],
-            ["I want to know about hospital and extras cover."]
-        ]
-    )
+    if worker_pool is not None:
+        # Each session is always served by the same worker process.
+        try:
+            async for response in worker_pool.submit(session_id, message):
+                yield response
+        except RuntimeError as e:
+            yield f"An error occurred: {e}"
+        return
+    async for response in process_message(message, history, session_id):
+        yield response
+
+def build_demo():
+    """Builds the chat UI."""
+    import gradio as gr
+
+    with gr.Blocks() as demo:
+        gr.Markdown("# Health Insurance Agent")
+        session_id_state = gr.State(lambda: str(uuid.uuid4()))
+
+        gr.ChatInterface(
+            fn=chat_interface_fn,
+            additional_inputs=[session_id_state],
+            title="Health Insurance Chatbot",
+            description="Ask me about health insurance products!",
+            examples=[
+                ["I need hospital cover for my family"],
+                ["What extras products do you have?"],
+                ["I want to know about hospital and extras cover."]
+            ]
+        )
+    return demo
+
+# Everything with side effects (session database, runner, workers, UI) happens here,
+# so spawned worker processes (e.g. PDF page extraction) can import this module cheaply.
+if __name__ == "__main__":
+    if serving.SERVING_WORKERS > 1:
+        # Load the model, catalogue and corpus once, then fork the workers before the UI starts its threads.
+        worker_pool = serving.WorkerPool(worker_turn, serving.SERVING_WORKERS, initializer=init_runner)
+        worker_pool.start()
+    else:
+        init_runner()
+        if os.environ.get("RAG_WARMUP", "1") != "0":
+            # Load the embedding model in the background so the UI comes up immediately.
+            embeddings.start_background_warmup()
+    build_demo().launch(share=True)
 
-demo.launch(share=True)
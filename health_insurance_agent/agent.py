@@ -1,27 +1,41 @@
+import asyncio
+from functools import partial
+
 from google.adk.agents import Agent
-from typing import List, Dict, Any
-import requests
-import pdfplumber
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
-from io import BytesIO
+from google.adk.tools import ToolContext
+from typing import List, Dict, Any, Optional
+
+from . import ingestion, retrieval, tracing
+from .answer_cache import answer_cache
+from .catalogue import get_catalogue
+from .corpus_index import product_corpus
+from .encoder import query_encoder
+from .rag_store import DocumentStore
 
 # --- RAG Components ---
 
-# In-memory store for the RAG data (simple approach for this use case)
-rag_storage = {
-    "index": None,
-    "chunks": []
-}
+# Session-scoped store for the RAG data. Sessions that load the same PDF share one index.
+document_store = DocumentStore()
+
+# Session state keys: the product last returned to the user, and the pre-built
+# corpus shard (if any) holding its document.
+CURRENT_PRODUCT_KEY = "current_product_id"
+CORPUS_SHARD_KEY = "corpus_shard_id"
+
+# How many ranked products `get_health_insurance_products` considers.
+PRODUCT_MATCHES = 3
 
-# Load the embedding model once to be reused.
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+def _session_id(tool_context: ToolContext) -> str:
+    """Returns the id of the ADK session the tool is being called from."""
+    return tool_context.session.id
 
-def process_product_document(pdf_url: str) -> Dict[str, str]:
+# ADK sends tool docstrings to the model as tool descriptions on every turn, so
+# they only say what a tool does and what its arguments mean. Implementation
+# notes live in comments.
+
+async def process_product_document(pdf_url: str, tool_context: ToolContext) -> Dict[str, str]:
     """
-    Downloads a PDF from a URL, processes its content, and prepares it for RAG.
-    This involves extracting text, chunking it, creating embeddings, and building a FAISS index.
+    Downloads a product PDF from a URL and prepares it for answering questions about the product.
 
     Args:
         pdf_url: The URL of the product PDF to process.
@@ -29,68 +43,104 @@ def process_product_document(pdf_url: str) -> Dict[str, str]:
     Returns:
         A dictionary with the status of the operation.
     """
-    global rag_storage
+    # PDFs in the pre-built product corpus are not downloaded at all. Others are
+    # downloaded and processed off the event loop (extracting, chunking, embedding
+    # and indexing), with the result cached on disk keyed by the PDF content. The
+    # document is attached to the calling session only, and shared with other
+    # sessions using the same PDF.
     try:
-        # 1. Download PDF from the URL
-        response = requests.get(pdf_url)
-        response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-        pdf_file = BytesIO(response.content)
-
-        # 2. Extract Text using pdfplumber
-        text_content = ""
-        with pdfplumber.open(pdf_file) as pdf:
-            for page in pdf.pages:
-                text_content += page.extract_text() + "\n"
-
-        if not text_content.strip():
-            return {"status": "error", "message": "Could not extract text from the PDF."}
-
-        # 3. Text Chunking (simple split by paragraph)
-        chunks = [p.strip() for p in text_content.split('\n\n') if p.strip()]
+        shard_id = product_corpus.shard_for_pdf(pdf_url)
+        tool_context.state[CORPUS_SHARD_KEY] = shard_id
+        if shard_id is not None:
+            shard = await product_corpus.get_shard_async(shard_id)
+            return {"status": "success", "message": f"Document is already indexed with {len(shard['chunks'])} chunks."}
 
-        # 4. Create Embeddings for the chunks
-        embeddings = embedding_model.encode(chunks, convert_to_tensor=True)
-        embeddings_np = embeddings.cpu().numpy()
+        key, pdf_bytes = await ingestion.fetch_document(pdf_url)
 
-        # 5. Build and Store Vector Store (FAISS)
-        index = faiss.IndexFlatL2(embeddings_np.shape[1])
-        index.add(embeddings_np)
+        if document_store.has_document(key):
+            loaded, source = None, "loaded shared"
+        else:
+            loaded, source = await ingestion.load_document(pdf_url, key, pdf_bytes)
 
-        rag_storage["index"] = index
-        rag_storage["chunks"] = chunks
+        # No await between the check above and attaching, so a shared document cannot be released in between.
+        document = document_store.attach(_session_id(tool_context), key, lambda: loaded)
 
-        return {"status": "success", "message": f"Successfully processed document with {len(chunks)} chunks."}
+        return {"status": "success", "message": f"Successfully {source} document with {len(document['chunks'])} chunks."}
 
     except Exception as e:
         # Log the exception for debugging if needed
         print(f"Error processing PDF: {e}")
         return {"status": "error", "message": f"Failed to process PDF: {str(e)}"}
 
-def answer_from_product_document(user_question: str) -> Dict[str, str]:
+async def answer_from_product_document(
+    user_question: str,
+    tool_context: ToolContext,
+    k: Optional[int] = None,
+    retrieval_mode: Optional[str] = None,
+    rerank: Optional[bool] = None
+) -> Dict[str, str]:
     """
     Retrieves relevant context from the processed PDF to answer a user's question.
 
     Args:
         user_question: The user's question about the product.
+        k: Optional number of document sections to retrieve (1 to 10, default 3).
+        retrieval_mode: Optional search mode: 'hybrid' (default), 'dense' (meaning) or 'sparse' (exact keywords).
+        rerank: Optional; re-score the results for higher precision.
 
     Returns:
         A dictionary containing the retrieved context to help answer the question.
     """
-    if not rag_storage["index"] or not rag_storage["chunks"]:
-        return {"context": "The product document has not been processed yet. Please use the 'process_product_document' tool first."}
+    # 'hybrid' fuses dense (embedding) and keyword (BM25) results, finding both
+    # paraphrased questions and exact terms such as item numbers or dollar limits;
+    # `rerank` re-scores them with a cross-encoder within a time budget. Questions
+    # similar to ones already answered for the same document reuse the cached context.
+    #
+    # Prefer the pre-built corpus shard for the current product (only that shard
+    # is searched), falling back to a document the session processed itself.
+    shard_id = tool_context.state.get(CORPUS_SHARD_KEY)
+    if shard_id is not None:
+        document = await product_corpus.get_shard_async(shard_id)
+    else:
+        document = document_store.get(_session_id(tool_context))
 
-    try:
-        # 1. Create an embedding for the user's question
-        question_embedding = embedding_model.encode([user_question], convert_to_tensor=True)
-        question_embedding_np = question_embedding.cpu().numpy()
+    if document is None or not document["chunks"]:
+        return {"context": "The product document has not been processed yet. Please use the 'process_product_document' tool first."}
 
-        # 2. Perform similarity search in the FAISS index
-        k = 3  # Retrieve the top 3 most relevant chunks
-        distances, indices = rag_storage["index"].search(question_embedding_np, k)
+    k = min(max(k or retrieval.RETRIEVAL_K, 1), retrieval.MAX_RETRIEVAL_K)
+    retrieval_mode = retrieval_mode or retrieval.RETRIEVAL_MODE
+    rerank = retrieval.RERANK if rerank is None else rerank
+    if retrieval_mode not in retrieval.RETRIEVAL_MODES:
+        return {"context": f"Unknown retrieval mode '{retrieval_mode}'. Use one of: {', '.join(retrieval.RETRIEVAL_MODES)}."}
+    # Contexts retrieved with different settings are cached separately.
+    cache_scope = f"{retrieval_mode}:k{k}:rerank{int(rerank)}"
 
-        # 3. Formulate the context from the retrieved chunks
-        retrieved_chunks = [rag_storage["chunks"][i] for i in indices[0]]
-        context = "\n\n---\n\n".join(retrieved_chunks)
+    try:
+        # 1. Create an embedding for the user's question (batched with other sessions, or cached)
+        question_embedding = await query_encoder.encode_async(user_question)
+
+        # 2. Reuse the context of a sufficiently similar question, skipping the search
+        with tracing.span("answer_cache.lookup", scope=cache_scope) as span:
+            cached = answer_cache.lookup(document["key"], question_embedding, cache_scope)
+            span.set_attribute("cache_hit", cached is not None)
+        if cached is not None:
+            return {"context": cached["context"]}
+
+        # 3. Dense and/or BM25 search, fused and optionally reranked, off the event loop
+        retrieved_chunks, reranked = await asyncio.get_running_loop().run_in_executor(
+            None,
+            tracing.bind(partial(retrieval.retrieve, document, user_question, question_embedding, k, retrieval_mode, rerank))
+        )
+
+        # 4. Formulate the context from the retrieved chunks
+        context = "\n\n---\n\n".join(f"[Page {chunk['page']}]\n{chunk['text']}" for chunk in retrieved_chunks)
+        if not context:
+            context = "No relevant sections were found in the product document."
+        if rerank and not reranked:
+            # Reranking was skipped (model still loading, or over budget): this is the
+            # plain fused order, so it must not answer later reranked questions.
+            cache_scope = f"{retrieval_mode}:k{k}:rerank0"
+        answer_cache.put(document["key"], question_embedding, context, cache_scope)
 
         return {"context": context}
 
@@ -103,11 +153,13 @@ def answer_from_product_document(user_question: str) -> Dict[str, str]:
 def get_health_insurance_products(
     family_type: str,
     cover_type: str,
-    preferred_services: List[str]
+    preferred_services: List[str],
+    tool_context: ToolContext
 ) -> Dict[str, Any]:
     """
-    Placeholder tool to simulate fetching health insurance products.
-    For now, it logs the received criteria and returns a confirmation message.
+    Finds the health insurance products that best match the user's criteria.
+    Products are filtered by cover type and family type from the product catalogue,
+    then ranked by how well they cover the preferred services.
 
     Args:
         family_type: Who the cover is for (e.g., 'Single', 'Couple', 'Family', 'Single Parent').
@@ -115,7 +167,9 @@ def get_health_insurance_products(
         preferred_services: A list of specific services the user is interested in (e.g., ['dental', 'physio']).
 
     Returns:
-        A JSON string of a health insurance product, including the name, price, tier, product URL, and services.
+        The best matching health insurance product, including the name, price, tier, product URL,
+        product PDF and services, its `match_score` (0 to 1), and a summary of the next best
+        products in `other_matches`.
 
     Example:
         >>> get_health_insurance_products("Single", "hospital", ["dental", "physio"])
@@ -123,120 +177,26 @@ def get_health_insurance_products(
             "product_name": "Name of the product"
         }'
     """
-
-    hospital_product = {
-        "product_id": "bupa_prod_003",
-        "product_name": "Bronze Plus Simple Hospital",
-        "price": "From $ 21 .62* / week",
-        "tier": "Bronze Plus Hospital",
-        "product_url": "https://www.bupa.com.au/health-insurance/cover/bronze-plus-simple-hospital",
-        "product_pdf": "https://bupaanzstdhtauspub01.blob.core.windows.net/productfiles/Bronze_Plus_Simple_Hospital_750_Excess_NSW_ACT_S_20250203_115425.pdf",
-        "services": [
-            {"service_name": "Lung and chest", "coverage_status": "Included"},
-            {"service_name": "Gastrointestinal endoscopy", "coverage_status": "Included"},
-            {"service_name": "Heart and vascular system", "coverage_status": "Excluded"},
-            {"service_name": "Joint replacements", "coverage_status": "Excluded"},
-            {"service_name": "Pregnancy and birth", "coverage_status": "Excluded"},
-            {"service_name": "Rehabilitation", "coverage_status": "Restricted"},
-            {"service_name": "Hospital psychiatric services", "coverage_status": "Restricted"},
-            {"service_name": "Palliative care", "coverage_status": "Restricted"},
-            {"service_name": "Brain and nervous system", "coverage_status": "Included"},
-            {"service_name": "Blood", "coverage_status": "Included"},
-            {"service_name": "Chemotherapy, radiotherapy and immunotherapy for cancer", "coverage_status": "Included"},
-            {"service_name": "Eye (not cataracts)", "coverage_status": "Included"},
-            {"service_name": "Cataracts", "coverage_status": "Excluded"},
-            {"service_name": "Ear, nose and throat", "coverage_status": "Included"},
-            {"service_name": "Implantation of hearing devices", "coverage_status": "Excluded"},
-            {"service_name": "Tonsils, adenoids and grommets", "coverage_status": "Included"},
-            {"service_name": "Bone, joint and muscle", "coverage_status": "Included"},
-            {"service_name": "Joint reconstructions", "coverage_status": "Included"},
-            {"service_name": "Back, neck and spine", "coverage_status": "Excluded"},
-            {"service_name": "Kidney and bladder", "coverage_status": "Included"},
-            {"service_name": "Dialysis for chronic kidney failure", "coverage_status": "Excluded"},
-            {"service_name": "Digestive system", "coverage_status": "Included"},
-            {"service_name": "Hernia and appendix", "coverage_status": "Included"},
-            {"service_name": "Weight loss surgery", "coverage_status": "Excluded"},
-            {"service_name": "Gynaecology", "coverage_status": "Included"},
-            {"service_name": "Miscarriage and termination of pregnancy", "coverage_status": "Included"},
-            {"service_name": "Assisted reproductive services", "coverage_status": "Excluded"},
-            {"service_name": "Male reproductive system", "coverage_status": "Included"},
-            {"service_name": "Diabetes management (excluding insulin pumps)", "coverage_status": "Included"},
-            {"service_name": "Insulin pumps", "coverage_status": "Excluded"},
-            {"service_name": "Pain management", "coverage_status": "Included"},
-            {"service_name": "Pain management with device", "coverage_status": "Excluded"},
-            {"service_name": "Breast surgery (medically necessary)", "coverage_status": "Included"},
-            {"service_name": "Plastic and reconstructive surgery (medically necessary)", "coverage_status": "Excluded"},
-            {"service_name": "Skin", "coverage_status": "Included"},
-            {"service_name": "Dental surgery", "coverage_status": "Included"},
-            {"service_name": "Sleep studies", "coverage_status": "Included"},
-            {"service_name": "Podiatric surgery (provided by a registered podiatric surgeon)", "coverage_status": "Included"}
-        ]
-    }
-
-    extras_product = {
-        "product_id": "bupa_prod_006",
-        "product_name": "Wellness Extras",
-        "price": "From $12.50* / week",
-        "tier": "Extras",
-        "product_url": "https://www.bupa.com.au/health-insurance/cover/wellness-extras",
-        "product_pdf": "https://bupaanzstdhtauspub01.blob.core.windows.net/productfiles/Wellness_Extras_NSW_ACT_S_20250402_140646.pdf",
-        "services": [
-            {"service_name": "General Dental", "coverage_status": "Included"},
-            {"service_name": "Major Dental & Endodontic", "coverage_status": "Included"},
-            {"service_name": "Orthodontic", "coverage_status": "Included"},
-            {"service_name": "Optical", "coverage_status": "Included"},
-            {"service_name": "Physiotherapy", "coverage_status": "Included"},
-            {"service_name": "Chiropractic & Osteopathy", "coverage_status": "Included"},
-            {"service_name": "Podiatry", "coverage_status": "Included"},
-            {"service_name": "Foot Orthotics", "coverage_status": "Included"},
-            {"service_name": "Dietary", "coverage_status": "Included"},
-            {"service_name": "Mental Health (incl. Psychology)", "coverage_status": "Included"},
-            {"service_name": "Digital Mental Health", "coverage_status": "Included"},
-            {"service_name": "Acupuncture", "coverage_status": "Included"},
-            {"service_name": "Remedial Massage", "coverage_status": "Included"},
-            {"service_name": "Chinese Herbalism", "coverage_status": "Included"},
-            {"service_name": "Exercise Physiology", "coverage_status": "Included"},
-            {"service_name": "Non PBS Pharmaceuticals", "coverage_status": "Included"},
-            {"service_name": "Travel & Accommodation", "coverage_status": "Included"},
-            {"service_name": "Emergency Ambulance Services", "coverage_status": "Included"},
-            {"service_name": "Ante Natal - Midwife", "coverage_status": "Excluded"},
-            {"service_name": "Speech Therapy", "coverage_status": "Excluded"},
-            {"service_name": "Eye Therapy", "coverage_status": "Excluded"},
-            {"service_name": "Occupational Therapy", "coverage_status": "Excluded"},
-            {"service_name": "Health Management", "coverage_status": "Excluded"},
-            {"service_name": "Online Doctor Appointments", "coverage_status": "Excluded"},
-            {"service_name": "Home Nursing", "coverage_status": "Excluded"},
-            {"service_name": "Health Aids & Appliances", "coverage_status": "Excluded"},
-            {"service_name": "Hearing Aids", "coverage_status": "Excluded"},
-            {"service_name": "Blood Glucose Monitors", "coverage_status": "Excluded"}
-        ]
-    }
-
-    combined_product = {
-        "product_id": "bupa_prod_007",
-        "product_name": "Bronze Plus Simple Hospital with Wellness Extras",
-        "price": "From $55.50* / week",
-        "tier": "Hospital and Extras",
-        "product_url": "https://www.bupa.com.au/health-insurance/cover/bronze-plus-simple-hospital-with-wellness-extras",
-        "product_pdf": "https://bupaanzstdhtauspub01.blob.core.windows.net/productfiles/Bronze_Plus_Simple_Hospital_750_Excess_NSW_ACT_S_20250203_115425.pdf",
-        "services": [
-            {"service_name": "Hospital - Joint reconstructions", "coverage_status": "Included"},
-            {"service_name": "Hospital - Bone, joint and muscle", "coverage_status": "Included"},
-            {"service_name": "Extras - General Dental", "coverage_status": "Included"},
-            {"service_name": "Extras - Physiotherapy", "coverage_status": "Included"},
-            {"service_name": "Extras - Emergency Ambulance", "coverage_status": "Included"}
-        ]
-    }
-
-    if cover_type == 'hospital':
-        return hospital_product
-    elif cover_type == 'extras':
-        return extras_product
-    elif cover_type == 'both':
-        return combined_product
-    else:
-    # Default to hospital product if cover_type is not specified or recognized
-        return hospital_product
+    matches = get_catalogue().search(family_type, cover_type, preferred_services, top_n=PRODUCT_MATCHES)
+    if not matches:
+        return {"status": "error", "message": "No products match the requested cover and family type."}
+
+    best, score = matches[0]
+    product = dict(best, match_score=round(score, 2))
+    product["other_matches"] = [
+        {
+            "product_id": other["product_id"],
+            "product_name": other["product_name"],
+            "price": other["price"],
+            "match_score": round(other_score, 2)
+        }
+        for other, other_score in matches[1:]
+    ]
+
+    # Remember the product so follow-up questions search its pre-built index.
+    tool_context.state[CURRENT_PRODUCT_KEY] = product["product_id"]
+    tool_context.state[CORPUS_SHARD_KEY] = product_corpus.shard_for_product(product["product_id"])
+    return product
 
 
 system_prompt = """
@@ -263,8 +223,8 @@ system_prompt = """
 - You have three tools available: `get_health_insurance_products`, `process_product_document`, and `answer_from_product_document`.
 - **Step 1: Get Product.** Use `get_health_insurance_products` ONLY AFTER you have collected all the required information (who the cover is for, type of cover, preferred services) AND you have confirmed this information with the user.
 - **Step 2: Process PDF.** After `get_health_insurance_products` returns a product with a `product_pdf` URL, you MUST immediately call `process_product_document` with that URL. Do not wait for the user.
-- **Step 3: Present and Invite.** After `process_product_document` returns a success status, present the product information in a table as specified below. Then, invite the user to ask specific questions about the product, letting them know you can find details in the document. For example: "I have processed the product details. Please let me know if you have any specific questions about what's covered."
-- **Step 4: Answer Questions.** When the user asks a follow-up question about the product, use the `answer_from_product_document` tool to get relevant context from the PDF. Use this retrieved context to formulate your answer. If the context does not contain the answer, say so. For example: "Based on the document, here is what I found: [context]. If this doesn't answer your question, the detail might not be in the summary document."
+- **Step 3: Present and Invite.** After `process_product_document` returns a success status, present the product information in a table as specified below. If `other_matches` is not empty, briefly list those alternatives after the table. Then, invite the user to ask specific questions about the product, letting them know you can find details in the document. For example: "I have processed the product details. Please let me know if you have any specific questions about what's covered."
+- **Step 4: Answer Questions.** When the user asks a follow-up question about the product, use the `answer_from_product_document` tool to get relevant context from the PDF. Use this retrieved context to formulate your answer. If the context does not contain the answer, say so. The defaults suit most questions; if the first results miss the answer, retry with a larger `k` or with `rerank` set to true. For example: "Based on the document, here is what I found: [context]. If this doesn't answer your question, the detail might not be in the summary document."
 </tool-usage>
 
 <product-table>
@@ -314,6 +274,13 @@ root_agent = Agent(
     description="A friendly assistant for health insurance product discussions.",
     instruction=system_prompt,
     tools=[get_health_insurance_products, process_product_document, answer_from_product_document],
-    output_key="search_criteria"
+    output_key="search_criteria",
+    # Record a tracing span for every LLM call and tool invocation.
+    before_model_callback=tracing.before_model_callback,
+    after_model_callback=tracing.after_model_callback,
+    on_model_error_callback=tracing.on_model_error_callback,
+    before_tool_callback=tracing.before_tool_callback,
+    after_tool_callback=tracing.after_tool_callback,
+    on_tool_error_callback=tracing.on_tool_error_callback
 )
 
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# --- Semantic Answer Cache ---
+#
+# Users ask the same few questions about the same product over and over
+# ("is pregnancy covered?", "what's the excess?"). For each document we keep
+# the embeddings of recently answered questions with the context retrieved for
+# them; a new question whose embedding is close enough to a cached one reuses
+# that context without searching the index at all. Entries are also tagged with
+# a scope (the retrieval settings that produced them), and only entries of the
+# same scope can answer a lookup.
+
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("RAG_ANSWER_CACHE_TTL_SECONDS", 60 * 60))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_ANSWER_CACHE_MAX_ENTRIES", 256))
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class SemanticAnswerCache:
+    """Per-document cache mapping question embeddings to retrieved contexts."""
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # document key -> {"vectors": (n, d) array of unit vectors, "entries": [{...}, ...]}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def lookup(self, document_key: str, question_embedding: np.ndarray, scope: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Finds a cached entry for a question similar enough to this one, retrieved with the same scope.
+
+        Returns:
+            The cached entry (with `context` and `similarity`), or None on a miss.
+        """
+        query = _normalize(question_embedding)
+        with self._lock:
+            document = self._documents.get(document_key)
+            if document is not None:
+                self._expire_locked(document)
+            if document is None or not document["entries"]:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = document["vectors"] @ query
+            similarities[[entry["scope"] != scope for entry in document["entries"]]] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            return dict(document["entries"][best], similarity=float(similarities[best]))
+
+    def put(self, document_key: str, question_embedding: np.ndarray, context: str, scope: str = "") -> None:
+        """Caches the context retrieved for a question, evicting the oldest entry when full."""
+        vector = _normalize(question_embedding)
+        with self._lock:
+            document = self._documents.setdefault(
+                document_key, {"vectors": np.empty((0, vector.shape[0]), dtype=np.float32), "entries": []}
+            )
+            document["vectors"] = np.vstack([document["vectors"], vector])[-self.max_entries:]
+            document["entries"].append({"context": context, "scope": scope, "created": time.time()})
+            document["entries"] = document["entries"][-self.max_entries:]
+
+    def invalidate(self, document_key: str) -> None:
+        """Drops every cached entry for a document, e.g. after it has been re-ingested."""
+        with self._lock:
+            if self._documents.pop(document_key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        """Drops every cached entry for every document."""
+        with self._lock:
+            self._documents.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                hit_rate=self._stats["hits"] / lookups if lookups else 0.0,
+                documents=len(self._documents),
+                entries=sum(len(d["entries"]) for d in self._documents.values())
+            )
+
+    def _expire_locked(self, document: Dict[str, Any]) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        entries: List[Dict[str, Any]] = document["entries"]
+        # Entries are appended in time order, so expired ones form a prefix.
+        expired = 0
+        while expired < len(entries) and entries[expired]["created"] < cutoff:
+            expired += 1
+        if expired:
+            document["entries"] = entries[expired:]
+            document["vectors"] = document["vectors"][expired:]
+
+
+# Shared cache used by `answer_from_product_document`.
+answer_cache = SemanticAnswerCache()
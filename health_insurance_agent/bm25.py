@@ -0,0 +1,85 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# --- BM25 Sparse Index ---
+#
+# Dense embeddings are weak at exact terms: item numbers, dollar limits and
+# service names such as "Joint replacements". A small in-memory inverted index
+# scored with Okapi BM25 catches those. The BM25 contribution of every
+# (term, chunk) pair is precomputed at build time, so a query is a handful of
+# scatter-adds into a score array.
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "i", "if", "in",
+    "is", "it", "my", "of", "on", "or", "the", "this", "to", "what", "when", "which", "with", "you", "your"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercases and splits text into terms, normalising amounts ('$1,000' -> '1000') and plurals."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        token = token.replace(",", "")
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss") and token.isalpha():
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """Inverted index over a document's chunk texts, in index order."""
+
+    def __init__(self, texts: List[str], k1: float = BM25_K1, b: float = BM25_B):
+        self.size = len(texts)
+        term_frequencies = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(tf.values()) for tf in term_frequencies], dtype=np.float32)
+        average_length = float(lengths.mean()) if self.size and lengths.mean() > 0 else 1.0
+        # Per-chunk denominator term of BM25, k1 * (1 - b + b * |d| / avgdl).
+        norms = k1 * (1 - b + b * lengths / average_length)
+
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for chunk_id, tf in enumerate(term_frequencies):
+            for term, count in tf.items():
+                postings.setdefault(term, []).append((chunk_id, count))
+
+        # term -> (chunk ids, precomputed BM25 weights)
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, entries in postings.items():
+            ids = np.array([chunk_id for chunk_id, _ in entries], dtype=np.int32)
+            counts = np.array([count for _, count in entries], dtype=np.float32)
+            idf = math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[term] = (ids, (idf * counts * (k1 + 1) / (counts + norms[ids])).astype(np.float32))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(ids.nbytes + weights.nbytes + len(term) for term, (ids, weights) in self._postings.items())
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores every chunk against the query.
+
+        Returns:
+            A tuple of (scores, chunk ids) for up to `k` chunks with a positive score, best first.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term, repeats in Counter(tokenize(query)).items():
+            posting = self._postings.get(term)
+            if posting is not None:
+                ids, weights = posting
+                scores[ids] += weights * repeats
+
+        matched = np.flatnonzero(scores)
+        if matched.size > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return scores[order], order
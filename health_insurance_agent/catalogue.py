@@ -0,0 +1,228 @@
+import difflib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# --- Product Catalogue ---
+#
+# Products are loaded once from a JSON data file into a compact structure:
+#
+#   - one boolean mask per cover type and per family type (which products offer it)
+#   - an int8 coverage matrix of shape (services, products) holding each
+#     product's coverage status for every distinct service name
+#
+# Filtering is a mask intersection and ranking is a handful of vectorised
+# row lookups, so lookups stay in the microsecond range for thousands of products.
+
+CATALOGUE_PATH = os.environ.get(
+    "PRODUCT_CATALOGUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "products.json")
+)
+
+# Coverage status codes stored in the coverage matrix (0 = service not listed).
+STATUS_CODES = {"Excluded": 1, "Restricted": 2, "Included": 3}
+# How much a product scores for a preferred service, indexed by status code.
+_STATUS_SCORES = np.array([0.0, 0.0, 0.5, 1.0], dtype=np.float32)
+
+COVER_TYPE_ALIASES = {
+    "hospital": "hospital",
+    "extras": "extras",
+    "both": "both",
+    "hospital and extras": "both",
+    "combined": "both"
+}
+
+# Everyday words users say, mapped to the wording used in product service lists.
+SERVICE_SYNONYMS = {
+    "physio": "physiotherapy",
+    "dentist": "dental",
+    "teeth": "dental",
+    "glasses": "optical",
+    "contacts": "optical",
+    "chiro": "chiropractic",
+    "osteo": "osteopathy",
+    "massage": "remedial massage",
+    "psychologist": "psychology",
+    "pregnancy": "pregnancy birth",
+    "maternity": "pregnancy birth",
+    "obstetrics": "pregnancy birth",
+    "baby": "pregnancy birth",
+    "ivf": "assisted reproductive",
+    "ambulance": "emergency ambulance",
+    "hearing": "hearing aids",
+    "hip": "joint replacements",
+    "knee": "joint replacements"
+}
+
+# Minimum similarity for a preferred service to count as matching a service name,
+# and how far below the best match other service names may be and still count.
+MATCH_THRESHOLD = 0.75
+MATCH_MARGIN = 0.1
+# Matched service preferences remembered, least recently used first out.
+MATCH_CACHE_SIZE = 4096
+
+_STOPWORDS = {"and", "the", "of", "for", "a", "an", "with", "incl", "including", "not", "by", "hospital", "extras"}
+
+
+def _tokens(text: str) -> Tuple[str, ...]:
+    words = re.sub(r"[^a-z0-9]+", " ", text.lower()).split()
+    return tuple(w for w in words if w not in _STOPWORDS)
+
+
+def _token_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    # "physio" vs "physiotherapy", "chiropractic" vs "chiro"
+    if min(len(a), len(b)) >= 4 and (a.startswith(b) or b.startswith(a)):
+        return 0.9
+    ratio = difflib.SequenceMatcher(None, a, b).ratio()
+    return ratio if ratio >= 0.85 else 0.0
+
+
+class ProductCatalogue:
+    """Immutable, indexed product catalogue with preference-based ranking."""
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.products = products
+        n = len(products)
+
+        self._cover_masks: Dict[str, np.ndarray] = {}
+        self._family_masks: Dict[str, np.ndarray] = {}
+        service_ids: Dict[str, int] = {}
+        cells: List[Tuple[int, int, int]] = []
+
+        for i, product in enumerate(products):
+            cover_type = COVER_TYPE_ALIASES.get(product.get("cover_type", "").lower(), product.get("cover_type", ""))
+            self._cover_masks.setdefault(cover_type, np.zeros(n, dtype=bool))[i] = True
+            for family_type in product.get("family_types", []):
+                self._family_masks.setdefault(family_type.lower(), np.zeros(n, dtype=bool))[i] = True
+            for service in product.get("services", []):
+                service_id = service_ids.setdefault(service["service_name"], len(service_ids))
+                cells.append((service_id, i, STATUS_CODES.get(service["coverage_status"], 0)))
+
+        self.service_names = list(service_ids)
+        self._service_tokens = [_tokens(name) for name in self.service_names]
+        self._coverage = np.zeros((len(self.service_names), n), dtype=np.int8)
+        for service_id, i, code in cells:
+            self._coverage[service_id, i] = code
+
+        self._match_cache: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = CATALOGUE_PATH) -> "ProductCatalogue":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def match_service(self, preference: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fuzzy-matches a user's preferred service (e.g. 'physio') to catalogue service names.
+
+        Returns:
+            A tuple of (service ids, similarities) for every service name above
+            `MATCH_THRESHOLD` and within `MATCH_MARGIN` of the best match.
+        """
+        key = " ".join(_tokens(preference))
+        with self._lock:
+            cached = self._match_cache.get(key)
+            if cached is not None:
+                self._match_cache.move_to_end(key)
+        if cached is not None:
+            return cached
+
+        wanted = []
+        for token in key.split():
+            wanted.extend(SERVICE_SYNONYMS.get(token, token).split())
+
+        ids, similarities = [], []
+        if wanted:
+            for service_id, service_tokens in enumerate(self._service_tokens):
+                if not service_tokens:
+                    continue
+                # How well each wanted word is covered by some word of the service name.
+                similarity = sum(
+                    max(_token_similarity(w, t) for t in service_tokens) for w in wanted
+                ) / len(wanted)
+                if similarity >= MATCH_THRESHOLD:
+                    ids.append(service_id)
+                    similarities.append(similarity)
+
+        if similarities:
+            best = max(similarities)
+            kept = [i for i, similarity in enumerate(similarities) if similarity >= best - MATCH_MARGIN]
+            ids = [ids[i] for i in kept]
+            similarities = [similarities[i] for i in kept]
+
+        result = (np.array(ids, dtype=np.intp), np.array(similarities, dtype=np.float32))
+        with self._lock:
+            self._match_cache[key] = result
+            # Keys are free-form user text, so the cache must not grow without bound.
+            while len(self._match_cache) > MATCH_CACHE_SIZE:
+                self._match_cache.popitem(last=False)
+        return result
+
+    def products_with_service(self, service_name: str, coverage_status: str = "Included") -> List[Dict[str, Any]]:
+        """Returns the products listing `service_name` with the given coverage status."""
+        try:
+            service_id = self.service_names.index(service_name)
+        except ValueError:
+            return []
+        rows = np.flatnonzero(self._coverage[service_id] == STATUS_CODES[coverage_status])
+        return [self.products[i] for i in rows]
+
+    def search(
+        self,
+        family_type: str,
+        cover_type: str,
+        preferred_services: List[str],
+        top_n: int = 3
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Filters products by cover type and family type, and ranks them by how well they
+        cover the preferred services (Included scores 1, Restricted 0.5, Excluded 0).
+
+        Returns:
+            Up to `top_n` (product, score) pairs, best first. Scores are between 0 and 1.
+        """
+        n = len(self.products)
+        cover_type = COVER_TYPE_ALIASES.get(cover_type.lower().strip(), "hospital")
+        mask = self._cover_masks.get(cover_type, np.zeros(n, dtype=bool))
+        family_mask = self._family_masks.get(family_type.lower().strip())
+        if family_mask is not None:
+            mask = mask & family_mask
+
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        scores = np.zeros(candidates.size, dtype=np.float32)
+        for preference in preferred_services:
+            service_ids, similarities = self.match_service(preference)
+            if service_ids.size:
+                coverage = self._coverage[np.ix_(service_ids, candidates)]
+                scores += (_STATUS_SCORES[coverage] * similarities[:, None]).max(axis=0)
+        if preferred_services:
+            scores /= len(preferred_services)
+
+        # Stable sort keeps catalogue order between equally scored products.
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [(self.products[candidates[i]], float(scores[i])) for i in order]
+
+
+_catalogue: Optional[ProductCatalogue] = None
+_catalogue_lock = threading.Lock()
+
+
+def get_catalogue() -> ProductCatalogue:
+    """Returns the shared catalogue, loading it from `CATALOGUE_PATH` on first use."""
+    global _catalogue
+    if _catalogue is None:
+        with _catalogue_lock:
+            if _catalogue is None:
+                _catalogue = ProductCatalogue.load()
+    return _catalogue
@@ -0,0 +1,100 @@
+import json
+import mmap
+import os
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Union
+
+import numpy as np
+
+# --- Compact Chunk Storage ---
+#
+# A document's chunks are held as one contiguous UTF-8 text buffer plus a small
+# structured array of (offset, length, page, section id) per chunk, instead of
+# a list of dictionaries with one Python string each. On disk the buffer and
+# the array are memory-mapped, so opening a cached document or corpus shard
+# reads no chunk text until a chunk is actually retrieved:
+#
+#   chunk_text.bin        chunk texts, back to back
+#   chunk_meta.npy        per-chunk offset, length, page and section id
+#   chunk_sections.json   distinct section headings, indexed by section id
+#
+# Indexing a ChunkStore returns the same {"text", "page", "section"} dictionary
+# the chunker produces, so callers do not depend on the storage layout.
+
+# Identifies the storage layout, for inclusion in cache and corpus variants.
+FORMAT = "chunks-v1"
+
+_TEXT_FILE = "chunk_text.bin"
+_META_FILE = "chunk_meta.npy"
+_SECTIONS_FILE = "chunk_sections.json"
+
+_META_DTYPE = np.dtype([("offset", "<i8"), ("length", "<i4"), ("page", "<i4"), ("section", "<i4")])
+
+
+class ChunkStore(Sequence):
+    """Read-only, sequence-like collection of a document's chunks, in index order."""
+
+    def __init__(self, text: Union[bytes, mmap.mmap], meta: np.ndarray, sections: List[str]):
+        self._text = text
+        self._meta = meta
+        self._sections = sections
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, Any]]) -> "ChunkStore":
+        """Packs chunker output (dictionaries with `text`, `page` and `section`) into a store."""
+        encoded = [chunk["text"].encode("utf-8") for chunk in chunks]
+        section_ids: Dict[str, int] = {}
+        meta = np.empty(len(chunks), dtype=_META_DTYPE)
+        offset = 0
+        for i, (chunk, data) in enumerate(zip(chunks, encoded)):
+            section = chunk.get("section") or ""
+            meta[i] = (offset, len(data), chunk.get("page") or 0, section_ids.setdefault(section, len(section_ids)))
+            offset += len(data)
+        return cls(b"".join(encoded), meta, list(section_ids))
+
+    @classmethod
+    def load(cls, directory: str) -> "ChunkStore":
+        """Opens a store written by `save`, memory-mapping the text and metadata."""
+        with open(os.path.join(directory, _SECTIONS_FILE), "r", encoding="utf-8") as f:
+            sections = json.load(f)
+        meta = np.load(os.path.join(directory, _META_FILE), mmap_mode="r")
+        with open(os.path.join(directory, _TEXT_FILE), "rb") as f:
+            # mmap cannot map an empty file.
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        if meta.dtype != _META_DTYPE or (len(meta) and int(meta[-1]["offset"]) + int(meta[-1]["length"]) > len(text)):
+            raise ValueError(f"Chunk store in {directory} is inconsistent.")
+        return cls(text, meta, sections)
+
+    def save(self, directory: str) -> None:
+        """Writes the store's files into `directory`, which must exist."""
+        with open(os.path.join(directory, _TEXT_FILE), "wb") as f:
+            f.write(self._text)
+        np.save(os.path.join(directory, _META_FILE), np.asarray(self._meta))
+        with open(os.path.join(directory, _SECTIONS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self._sections, f)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the chunk text and metadata."""
+        return len(self._text) + self._meta.nbytes
+
+    def text(self, i: int) -> str:
+        offset, length = int(self._meta[i]["offset"]), int(self._meta[i]["length"])
+        return self._text[offset:offset + length].decode("utf-8")
+
+    def texts(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chunk index out of range")
+        row = self._meta[i]
+        return {"text": self.text(i), "page": int(row["page"]), "section": self._sections[int(row["section"])] or None}
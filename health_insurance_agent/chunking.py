@@ -0,0 +1,221 @@
+import hashlib
+import os
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# --- Structure-aware Chunking ---
+#
+# pdfplumber output for product documents is a mix of headings, wrapped
+# paragraphs, bulleted service lists and benefit tables. Splitting on blank
+# lines yields either huge chunks or one-line fragments, so instead each page
+# is classified line by line and packed into chunks that:
+#
+#   - start a new chunk at every heading, and carry the heading as a prefix
+#   - keep list items and table rows whole, and paragraphs split by sentence
+#   - never exceed `max_tokens` tokenizer tokens, overlapping by `overlap_tokens`
+#   - skip header/footer lines repeated across pages, and duplicate chunks
+
+CHUNK_MAX_TOKENS = int(os.environ.get("RAG_CHUNK_MAX_TOKENS", 200))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("RAG_CHUNK_OVERLAP_TOKENS", 32))
+BOILERPLATE_MIN_PAGES = int(os.environ.get("RAG_BOILERPLATE_MIN_PAGES", 2))
+# Only this many lines at the top and bottom of a page are considered header/footer.
+_BOILERPLATE_EDGE_LINES = 2
+
+_BULLET = re.compile(r"^(?:[•●▪◦‣■□✓✔\-–*]|\(?\d{1,2}[.)]|\(?[a-z][.)])\s+")
+_NUMBER = re.compile(r"\$\s?\d[\d,]*(?:\.\d+)?|\d+(?:\.\d+)?%|\b\d[\d,]*(?:\.\d+)?\b")
+_PAGE_NUMBER = re.compile(r"^(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?$", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z(\"'])")
+# Section titles keep at most this many consecutive headings and this share of a chunk's tokens,
+# so a run of short heading-like lines (e.g. an unbulleted list of services) cannot crowd out the body.
+_MAX_HEADING_PARTS = 2
+_MAX_HEADING_SHARE = 0.25
+_MINOR_WORDS = {"a", "an", "and", "as", "at", "by", "for", "in", "of", "on", "or", "the", "to", "with", "your", "our"}
+
+
+def chunker_variant(max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> str:
+    """Describes the chunking settings, for inclusion in cache and corpus variants."""
+    return f"structured-v2-{max_tokens}-{overlap_tokens}-bp{BOILERPLATE_MIN_PAGES}"
+
+
+def token_counter(model: Any) -> Callable[[str], int]:
+    """Counts tokens with the embedding model's own tokenizer, excluding special tokens."""
+    tokenizer = model.tokenizer
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _line_kind(line: str, continues_paragraph: bool) -> str:
+    if _BULLET.match(line):
+        return "list"
+    words = line.split()
+    # Wrapped paragraph lines often mention amounts too ("Item 22010 is paid at 80% of ...").
+    if not continues_paragraph and len(words) <= 12 and len(_NUMBER.findall(line)) >= 2:
+        return "table"
+    if len(words) <= 8 and len(line) <= 80 and not line.endswith((".", ",", ";")):
+        if line.isupper() or line.endswith(":") or all(
+            not w[0].isalpha() or w[0].isupper() or w.lower() in _MINOR_WORDS for w in words
+        ):
+            return "heading"
+        # A short sentence-case line ("What's covered") after a finished sentence.
+        if len(words) <= 6 and line[0].isupper() and not continues_paragraph:
+            return "heading"
+    return "text"
+
+
+def _boilerplate_key(line: str) -> str:
+    # "Page 3 of 12" and "Page 4 of 12" are the same footer.
+    return re.sub(r"\d+", "#", " ".join(line.lower().split()))
+
+
+class Chunker:
+    """
+    Incremental chunker: feed pages in order with `add_page`, then call `finish`.
+    Each call returns the chunks completed so far as {"text", "page", "section"} dicts,
+    where `page` is the page the chunk starts on.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int] = lambda text: len(text.split()),
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        boilerplate_min_pages: int = BOILERPLATE_MIN_PAGES
+    ):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.boilerplate_min_pages = boilerplate_min_pages
+
+        self._line_pages: Counter = Counter()
+        self._seen: set = set()
+        self._heading: Optional[str] = None
+        self._heading_tokens = 0
+        # Units of the chunk being built: (text, tokens, separator before it, page)
+        self._units: List[Tuple[str, int, str, int]] = []
+        self._tokens = 0
+        self._carried = 0
+        self._ready: List[Dict[str, Any]] = []
+
+    def add_page(self, page_number: int, text: str) -> List[Dict[str, Any]]:
+        lines = [line.strip() for line in text.split("\n")]
+        lines = [line for line in lines if not _PAGE_NUMBER.match(line)]
+
+        content = [line for line in lines if line]
+        edges = set(content[:_BOILERPLATE_EDGE_LINES] + content[-_BOILERPLATE_EDGE_LINES:])
+        boilerplate = set()
+        for line in edges:
+            key = _boilerplate_key(line)
+            self._line_pages[key] += 1
+            if self._line_pages[key] >= self.boilerplate_min_pages:
+                boilerplate.add(line)
+
+        paragraph: List[str] = []
+        for line in lines + [""]:
+            if line in boilerplate:
+                continue
+            continues_paragraph = bool(paragraph) and not paragraph[-1].endswith((".", "!", "?", ":"))
+            kind = _line_kind(line, continues_paragraph) if line else "blank"
+            if kind == "text":
+                paragraph.append(line)
+                continue
+
+            if paragraph:
+                self._add_paragraph(" ".join(paragraph), page_number)
+                paragraph = []
+            if kind == "heading":
+                self._start_section(line)
+            elif kind in ("list", "table"):
+                self._add_unit(line, page_number, "\n")
+
+        return self._take_ready()
+
+    def finish(self) -> List[Dict[str, Any]]:
+        self._flush(carry_overlap=False)
+        return self._take_ready()
+
+    def _take_ready(self) -> List[Dict[str, Any]]:
+        ready, self._ready = self._ready, []
+        return ready
+
+    def _start_section(self, heading: str) -> None:
+        if self._units and len(self._units) > self._carried:
+            self._flush(carry_overlap=False)
+            self._heading = heading
+        elif self._heading and not self._units:
+            # Consecutive headings ("Hospital cover" / "What's included") form one section title.
+            parts = self._heading.split(" > ")[-(_MAX_HEADING_PARTS - 1):] + [heading]
+            self._heading = " > ".join(parts)
+        else:
+            self._units, self._tokens, self._carried = [], 0, 0
+            self._heading = heading
+        self._heading_tokens = self.count_tokens(self._heading)
+
+        limit = max(int(self.max_tokens * _MAX_HEADING_SHARE), 1)
+        if self._heading_tokens > limit and self._heading != heading:
+            self._heading = heading
+            self._heading_tokens = self.count_tokens(heading)
+        if self._heading_tokens > limit:
+            words = self._heading.split()
+            while len(words) > 1 and self.count_tokens(" ".join(words)) > limit:
+                words.pop()
+            self._heading = " ".join(words)
+            self._heading_tokens = self.count_tokens(self._heading)
+
+    def _add_paragraph(self, paragraph: str, page_number: int) -> None:
+        separator = "\n"
+        for sentence in _SENTENCE_END.split(paragraph):
+            self._add_unit(sentence, page_number, separator)
+            separator = " "
+
+    def _add_unit(self, text: str, page_number: int, separator: str) -> None:
+        budget = max(self.max_tokens - self._heading_tokens, 1)
+        tokens = self.count_tokens(text)
+
+        if tokens > budget:
+            words = text.split()
+            if len(words) > 1:
+                # A single sentence or row longer than a chunk: fall back to word windows,
+                # each strictly shorter than the text, so this recursion ends at single words.
+                step = max(len(words) * budget // tokens, 1)
+                for start in range(0, len(words), step):
+                    self._add_unit(" ".join(words[start:start + step]), page_number, " " if start else separator)
+                return
+            # A single word (e.g. a long URL) over budget: split it into character windows.
+            step = max(len(text) * budget // tokens, 1)
+            for start in range(0, len(text), step):
+                piece = text[start:start + step]
+                self._place_unit(piece, self.count_tokens(piece), page_number, "" if start else separator, budget)
+            return
+
+        self._place_unit(text, tokens, page_number, separator, budget)
+
+    def _place_unit(self, text: str, tokens: int, page_number: int, separator: str, budget: int) -> None:
+        if self._tokens + tokens > budget and len(self._units) > self._carried:
+            self._flush(carry_overlap=True)
+            if self._tokens + tokens > budget:
+                self._units, self._tokens, self._carried = [], 0, 0
+
+        self._units.append((text, tokens, separator, page_number))
+        self._tokens += tokens
+
+    def _flush(self, carry_overlap: bool) -> None:
+        units = self._units
+        if len(units) > self._carried:
+            body = units[0][0] + "".join(separator + text for text, _, separator, _ in units[1:])
+            digest = hashlib.sha1(" ".join(body.lower().split()).encode("utf-8")).digest()
+            if digest not in self._seen:
+                self._seen.add(digest)
+                text = f"{self._heading}\n{body}" if self._heading else body
+                self._ready.append({"text": text, "page": units[0][3], "section": self._heading})
+
+        carried: List[Tuple[str, int, str, int]] = []
+        if carry_overlap:
+            total = 0
+            for unit in reversed(units):
+                if total + unit[1] > self.overlap_tokens:
+                    break
+                carried.insert(0, unit)
+                total += unit[1]
+        self._units = carried
+        self._tokens = sum(unit[1] for unit in carried)
+        self._carried = len(carried)
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import chunk_store, index_factory, ingestion, retrieval, tracing
+
+# --- Pre-built Product Corpus Index ---
+#
+# `build_product_index.py` ingests every product PDF in the catalogue ahead of
+# time into an on-disk corpus, so conversations never pay ingestion latency.
+# The corpus is sharded by PDF (products sharing a PDF share a shard):
+#
+#   <CORPUS_DIR>/manifest.json        variant, shards, product -> shard, pdf -> shard
+#   <CORPUS_DIR>/shards/<shard_id>/
+#       index.faiss                   serialized FAISS index for one PDF
+#       embeddings.npy                chunk embeddings, used for index reports
+#       chunk_text.bin, chunk_meta.npy, chunk_sections.json
+#                                     chunks with page numbers, in index order (see chunk_store.py)
+#
+# Searching for a product only ever touches that product's shard, and shards
+# are memory-mapped on first use rather than loaded at startup.
+
+CORPUS_DIR = os.environ.get(
+    "RAG_CORPUS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_corpus")
+)
+
+_MANIFEST_FILE = "manifest.json"
+_SHARDS_DIR = "shards"
+
+
+class CorpusIndex:
+    """Lazily loaded, read-only view of a corpus built by `build_corpus`."""
+
+    def __init__(self, corpus_dir: str = CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        self._lock = threading.Lock()
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._shards: Dict[str, Dict[str, Any]] = {}
+
+    def _get_manifest(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._manifest is None:
+                self._manifest = self._read_manifest()
+            return self._manifest
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        empty = {"shards": {}, "products": {}, "pdfs": {}}
+        try:
+            with open(os.path.join(self.corpus_dir, _MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return empty
+        if manifest.get("variant") != ingestion.CACHE_VARIANT:
+            print(
+                f"Ignoring product corpus in {self.corpus_dir}: it was built with "
+                f"'{manifest.get('variant')}', expected '{ingestion.CACHE_VARIANT}'. "
+                "Re-run build_product_index.py."
+            )
+            return empty
+        return manifest
+
+    def shard_for_product(self, product_id: Optional[str]) -> Optional[str]:
+        return self._get_manifest()["products"].get(product_id)
+
+    def shard_for_pdf(self, pdf_url: str) -> Optional[str]:
+        return self._get_manifest()["pdfs"].get(pdf_url)
+
+    def get_shard(self, shard_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the document (`key`, `index`, `chunks` and `bm25`) for a shard, memory-mapping it on first use.
+        """
+        with self._lock:
+            shard = self._shards.get(shard_id)
+        if shard is not None:
+            return shard
+        if shard_id not in self._get_manifest()["shards"]:
+            return None
+
+        import faiss
+
+        path = os.path.join(self.corpus_dir, _SHARDS_DIR, shard_id)
+        with tracing.span("corpus.shard_load", shard=shard_id) as span:
+            chunks = chunk_store.ChunkStore.load(path)
+            index = faiss.read_index(
+                os.path.join(path, "index.faiss"),
+                faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+            index_factory.configure_search(index)
+            shard = retrieval.ensure_sparse_index({"key": shard_id, "index": index, "chunks": chunks})
+            span.set_attribute("chunks", len(chunks))
+        with self._lock:
+            return self._shards.setdefault(shard_id, shard)
+
+    async def get_shard_async(self, shard_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Like `get_shard`, but a shard that is not loaded yet is loaded on the
+        ingestion worker pool, so the event loop keeps serving other sessions.
+        """
+        with self._lock:
+            shard = self._shards.get(shard_id)
+        if shard is not None:
+            return shard
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(ingestion._executor, tracing.bind(self.get_shard), shard_id)
+
+    def preload(self) -> int:
+        """
+        Loads every shard now instead of on first use, e.g. before forking serving
+        workers so they share the loaded shards. Returns the number of shards.
+        """
+        shards = self._get_manifest()["shards"]
+        for shard_id in shards:
+            self.get_shard(shard_id)
+        return len(shards)
+
+    def load_embeddings(self) -> np.ndarray:
+        """Loads the embeddings of every shard into one float32 array, in manifest order."""
+        shards = self._get_manifest()["shards"]
+        return np.vstack([
+            np.load(os.path.join(self.corpus_dir, _SHARDS_DIR, shard_id, "embeddings.npy")).astype(np.float32)
+            for shard_id in shards
+        ])
+
+    def reload(self) -> None:
+        """Forgets the loaded manifest and shards so the next lookup re-reads the corpus."""
+        with self._lock:
+            self._manifest = None
+            self._shards = {}
+
+
+async def build_corpus(products: List[Dict[str, Any]], corpus_dir: str = CORPUS_DIR) -> Dict[str, Any]:
+    """
+    Ingests the `product_pdf` of every product into a sharded corpus at `corpus_dir`.
+    Documents go through the regular ingestion path, so the document cache is reused.
+    The new corpus is written next to the old one and swapped in when complete.
+
+    Returns:
+        The manifest of the built corpus.
+    """
+    import faiss
+
+    tmp_dir = f"{corpus_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_dir, _SHARDS_DIR))
+
+    manifest = {"variant": ingestion.CACHE_VARIANT, "built": time.time(), "shards": {}, "products": {}, "pdfs": {}}
+    try:
+        for product in products:
+            pdf_url = product.get("product_pdf")
+            if not pdf_url:
+                continue
+            if pdf_url not in manifest["pdfs"]:
+                key, pdf_bytes = await ingestion.fetch_document(pdf_url)
+                if key not in manifest["shards"]:
+                    document, source = await ingestion.load_document(pdf_url, key, pdf_bytes)
+                    shard_path = os.path.join(tmp_dir, _SHARDS_DIR, key)
+                    os.makedirs(shard_path)
+                    faiss.write_index(document["index"], os.path.join(shard_path, "index.faiss"))
+                    np.save(os.path.join(shard_path, "embeddings.npy"), np.asarray(document["embeddings"]))
+                    document["chunks"].save(shard_path)
+                    manifest["shards"][key] = {"pdf_url": pdf_url, "chunks": len(document["chunks"])}
+                    print(f"Indexed {pdf_url} ({source}, {len(document['chunks'])} chunks)")
+                manifest["pdfs"][pdf_url] = key
+            manifest["products"][product["product_id"]] = manifest["pdfs"][pdf_url]
+
+        with open(os.path.join(tmp_dir, _MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    old_dir = f"{corpus_dir}.{os.getpid()}.old"
+    if os.path.exists(corpus_dir):
+        os.replace(corpus_dir, old_dir)
+    os.replace(tmp_dir, corpus_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+# Shared corpus used by the agent's tools.
+product_corpus = CorpusIndex()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from . import chunk_store, index_factory
+
+# --- Document Cache ---
+#
+# Processed product documents are cached on disk so that repeated calls to
+# `process_product_document` for the same PDF do not re-download, re-parse and
+# re-embed it. The layout is:
+#
+#   <CACHE_DIR>/urls.json             url -> {etag, last_modified, content_hash}
+#   <CACHE_DIR>/entries/<key>/        one directory per (content hash, variant)
+#       meta.json                     bookkeeping used for LRU eviction
+#       text.txt                      extracted PDF text
+#       chunk_text.bin, chunk_meta.npy, chunk_sections.json
+#                                     text chunks with page numbers, in index order (see chunk_store.py)
+#       embeddings.npy                chunk embeddings (EMBEDDINGS_DTYPE)
+#       index.faiss                   serialized FAISS index
+#
+# Entries are keyed by the SHA-256 of the PDF bytes, so two URLs serving the
+# same file share one entry, and a URL whose content changes gets a new one.
+
+CACHE_DIR = os.environ.get(
+    "RAG_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_cache")
+)
+CACHE_MAX_BYTES = int(os.environ.get("RAG_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Searches only use the FAISS index, so stored embeddings can be kept at half precision.
+EMBEDDINGS_DTYPE = os.environ.get("RAG_EMBEDDINGS_DTYPE", "float16")
+
+_URLS_FILE = "urls.json"
+_URLS_LOCK_FILE = "urls.json.lock"
+_ENTRIES_DIR = "entries"
+_META_FILE = "meta.json"
+
+_lock = threading.Lock()
+
+
+def content_hash(data: bytes) -> str:
+    """Returns the SHA-256 hex digest of the raw PDF bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def entry_key(pdf_hash: str, variant: str) -> str:
+    """
+    Combines the PDF content hash with a variant string (embedding model, index
+    settings) so that changing how documents are processed never serves stale entries.
+    """
+    return hashlib.sha256(f"{pdf_hash}:{variant}".encode("utf-8")).hexdigest()
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(CACHE_DIR, _ENTRIES_DIR, key)
+
+
+def _write_json(path: str, data: Any) -> None:
+    # Write to a temporary file first so readers never see a half-written file.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str, default: Any) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _load_urls() -> Dict[str, Dict[str, Optional[str]]]:
+    return _read_json(os.path.join(CACHE_DIR, _URLS_FILE), {})
+
+
+@contextmanager
+def _urls_lock() -> Iterator[None]:
+    """Serializes updates of urls.json across threads and processes (e.g. serving workers)."""
+    with _lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, _URLS_LOCK_FILE), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def lookup_url(pdf_url: str) -> Optional[Dict[str, Optional[str]]]:
+    """Returns the cached validators and content hash recorded for a URL, if any."""
+    return _load_urls().get(pdf_url)
+
+
+def remember_url(pdf_url: str, pdf_hash: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+    """Records the content hash and HTTP validators last seen for a URL."""
+    # Read, update and atomically replace the file under the lock, so concurrent
+    # updates from other processes are not lost.
+    with _urls_lock():
+        urls = _load_urls()
+        urls[pdf_url] = {"etag": etag, "last_modified": last_modified, "content_hash": pdf_hash}
+        _write_json(os.path.join(CACHE_DIR, _URLS_FILE), urls)
+
+
+def conditional_headers(pdf_url: str, variant: str) -> Dict[str, str]:
+    """
+    Builds `If-None-Match` / `If-Modified-Since` headers for a URL whose processed
+    document is still in the cache, so the server can answer with `304 Not Modified`.
+    """
+    record = lookup_url(pdf_url)
+    if not record or not has_entry(entry_key(record["content_hash"], variant)):
+        return {}
+    headers = {}
+    if record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if record.get("last_modified"):
+        headers["If-Modified-Since"] = record["last_modified"]
+    return headers
+
+
+def has_entry(key: str) -> bool:
+    return os.path.exists(os.path.join(_entry_dir(key), _META_FILE))
+
+
+def load_entry(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Loads a cached document. The FAISS index, the embeddings and the chunks are
+    memory-mapped rather than read into memory, so a warm hit costs little more
+    than opening files.
+
+    Returns:
+        A dictionary with `text`, `chunks`, `embeddings` and `index`, or None on a miss.
+    """
+    import faiss
+
+    path = _entry_dir(key)
+    meta_path = os.path.join(path, _META_FILE)
+    meta = _read_json(meta_path, None)
+    if meta is None:
+        return None
+    try:
+        with open(os.path.join(path, "text.txt"), "r", encoding="utf-8") as f:
+            text = f.read()
+        chunks = chunk_store.ChunkStore.load(path)
+        embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        index = faiss.read_index(
+            os.path.join(path, "index.faiss"),
+            faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        )
+        index_factory.configure_search(index)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Discarding unreadable cache entry {key}: {e}")
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+
+    meta["last_access"] = time.time()
+    _write_json(meta_path, meta)
+    return {"text": text, "chunks": chunks, "embeddings": embeddings, "index": index}
+
+
+def store_entry(key: str, text: str, chunks: chunk_store.ChunkStore, embeddings: np.ndarray, index: Any) -> None:
+    """Writes a processed document to the cache and evicts old entries if over budget."""
+    import faiss
+
+    path = _entry_dir(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    try:
+        with open(os.path.join(tmp_path, "text.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        chunks.save(tmp_path)
+        np.save(os.path.join(tmp_path, "embeddings.npy"), np.ascontiguousarray(embeddings, dtype=EMBEDDINGS_DTYPE))
+        faiss.write_index(index, os.path.join(tmp_path, "index.faiss"))
+
+        size = sum(
+            os.path.getsize(os.path.join(tmp_path, name)) for name in os.listdir(tmp_path)
+        )
+        now = time.time()
+        _write_json(os.path.join(tmp_path, _META_FILE), {"size": size, "created": now, "last_access": now})
+
+        with _lock:
+            if os.path.exists(path):
+                # Another worker stored the same document first; keep theirs.
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            else:
+                os.replace(tmp_path, path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    evict(CACHE_MAX_BYTES)
+
+
+def evict(max_bytes: int) -> List[str]:
+    """
+    Removes least recently used entries until the cache fits in `max_bytes`.
+
+    Returns:
+        The keys of the evicted entries.
+    """
+    entries_root = os.path.join(CACHE_DIR, _ENTRIES_DIR)
+    if not os.path.isdir(entries_root):
+        return []
+
+    with _lock:
+        entries = []
+        for key in os.listdir(entries_root):
+            meta = _read_json(os.path.join(entries_root, key, _META_FILE), None)
+            if meta is not None:
+                entries.append((meta.get("last_access", 0), meta.get("size", 0), key))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, key in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(os.path.join(entries_root, key), ignore_errors=True)
+            total -= size
+            evicted.append(key)
+    return evicted
@@ -0,0 +1,45 @@
+import threading
+from typing import Any, Optional
+
+# --- Embedding Model ---
+#
+# Loading the SentenceTransformer pulls in torch and takes seconds, so it is
+# deferred until the first document or question actually needs it. Apps can
+# call `start_background_warmup()` after startup to load it off the hot path.
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+_embedding_model: Optional[Any] = None
+_lock = threading.Lock()
+
+
+def get_embedding_model() -> Any:
+    """Returns the shared embedding model, loading it on first use (thread-safe)."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                from sentence_transformers import SentenceTransformer
+                _embedding_model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _embedding_model
+
+
+def warm_up() -> None:
+    """Loads the embedding model and imports the other heavy RAG dependencies."""
+    import faiss  # noqa: F401
+    import pdfplumber  # noqa: F401
+    get_embedding_model()
+
+
+def start_background_warmup() -> threading.Thread:
+    """Runs `warm_up` in a daemon thread so startup is not delayed."""
+    def run() -> None:
+        try:
+            warm_up()
+        except Exception as e:
+            # Not fatal: the first request will load (and report) the model instead.
+            print(f"Background warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name="rag-warmup", daemon=True)
+    thread.start()
+    return thread
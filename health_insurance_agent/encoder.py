@@ -0,0 +1,146 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import tracing
+from .embeddings import get_embedding_model
+
+# --- Query Encoder Service ---
+#
+# Questions from every session are funnelled through one background thread that
+# waits a few milliseconds to gather concurrent requests and encodes them in a
+# single batch, which is far cheaper per question than back-to-back
+# single-item encodes. Repeated questions are answered from a bounded LRU cache.
+
+BATCH_WINDOW_MS = float(os.environ.get("RAG_ENCODE_BATCH_WINDOW_MS", 5))
+MAX_BATCH_SIZE = int(os.environ.get("RAG_ENCODE_MAX_BATCH", 64))
+QUERY_CACHE_SIZE = int(os.environ.get("RAG_QUERY_CACHE_SIZE", 4096))
+
+
+def normalize_question(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a question."""
+    return " ".join(text.lower().split())
+
+
+class EncoderService:
+    """Micro-batching, caching front end for a SentenceTransformer's `encode`."""
+
+    def __init__(
+        self,
+        model_loader: Callable[[], Any],
+        batch_window_ms: float = BATCH_WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        cache_size: int = QUERY_CACHE_SIZE
+    ):
+        # Called from the encoder thread, so the model loads there rather than in the first caller.
+        self.model_loader = model_loader
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"cache_hits": 0, "cache_misses": 0, "batches": 0, "encoded": 0}
+
+    def submit(self, text: str) -> Future:
+        """
+        Queues a text for encoding.
+
+        Returns:
+            A future resolving to its embedding, a read-only float32 vector.
+        """
+        key = normalize_question(text)
+        future: Future = Future()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self._stats["cache_hits"] += 1
+                future.set_result(cached)
+                return future
+            self._stats["cache_misses"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+                self._thread.start()
+        self._queue.put((key, future))
+        return future
+
+    def encode(self, text: str) -> np.ndarray:
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(text).result()
+
+    async def encode_async(self, text: str) -> np.ndarray:
+        """Awaits an embedding without blocking the event loop."""
+        with tracing.span("query.encode", chars=len(text)) as span:
+            future = self.submit(text)
+            span.set_attribute("cache_hit", future.done())
+            return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, cached=len(self._cache))
+
+    def _collect_batch(self) -> List[Tuple[str, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Callers awaiting through `asyncio.wrap_future` cancel the future when their
+        # task is cancelled (e.g. a closed browser tab); those need no encoding.
+        return [(key, future) for key, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self._encode_batch(self._collect_batch())
+            except Exception as e:
+                # Never let the thread die: queued and future callers would wait forever.
+                print(f"Error in query encoder: {e}")
+
+    def _encode_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        if not batch:
+            return
+        # The same question asked by several sessions at once is encoded once.
+        texts = list(dict.fromkeys(key for key, _ in batch))
+        try:
+            embeddings = self.model_loader().encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        by_text = {}
+        for text, embedding in zip(texts, embeddings):
+            embedding = np.array(embedding, dtype=np.float32)
+            embedding.flags.writeable = False
+            by_text[text] = embedding
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["encoded"] += len(texts)
+            for text, embedding in by_text.items():
+                self._cache[text] = embedding
+                self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        for key, future in batch:
+            future.set_result(by_text[key])
+
+
+# Shared encoder for user questions.
+query_encoder = EncoderService(get_embedding_model)
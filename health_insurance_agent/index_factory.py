@@ -0,0 +1,220 @@
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# --- Vector Index Factory ---
+#
+# Builds the FAISS index used for a document or corpus shard. An exact flat
+# index is ideal for a single PDF, but approximate indexes (IVF, HNSW, IVF with
+# product quantization) keep search fast once whole catalogues are indexed.
+# Approximate indexes fall back to flat below `ANN_MIN_VECTORS`, where training
+# is unreliable and exact search is already fast. faiss is imported inside the
+# functions that need it so importing the agent stays cheap.
+#
+# The scalar-quantized types store each dimension as float16 (`sqfp16`, half
+# the memory of flat) or as an 8-bit code scaled to the trained range of that
+# dimension (`sq8` and `ivfsq8`, a quarter). They are exhaustive like flat, so
+# they apply at any size; `recall_latency_report` measures what they cost in recall.
+
+INDEX_TYPES = ("flat", "sqfp16", "sq8", "ivf", "ivfsq8", "hnsw", "ivfpq")
+# Index types that compress vectors but still compare the query with every one of them.
+_EXHAUSTIVE_TYPES = ("flat", "sqfp16", "sq8")
+# FAISS factory suffix of the scalar-quantized codes.
+_SQ_CODES = {"sqfp16": "SQfp16", "sq8": "SQ8", "ivfsq8": "SQ8"}
+INDEX_METRICS = ("l2", "ip", "cosine")
+
+INDEX_TYPE = os.environ.get("RAG_INDEX_TYPE", "flat")
+INDEX_METRIC = os.environ.get("RAG_INDEX_METRIC", "l2")
+ANN_MIN_VECTORS = int(os.environ.get("RAG_ANN_MIN_VECTORS", 2048))
+IVF_NLIST = int(os.environ.get("RAG_IVF_NLIST", 0))  # 0 picks a size from the number of vectors
+NPROBE = int(os.environ.get("RAG_NPROBE", 8))
+HNSW_M = int(os.environ.get("RAG_HNSW_M", 32))
+EF_CONSTRUCTION = int(os.environ.get("RAG_EF_CONSTRUCTION", 80))
+EF_SEARCH = int(os.environ.get("RAG_EF_SEARCH", 64))
+PQ_M = int(os.environ.get("RAG_PQ_M", 16))
+
+# Vectors per IVF list FAISS wants for training, and centroids per PQ sub-quantizer.
+_MIN_POINTS_PER_CENTROID = 39
+_PQ_CENTROIDS = 256
+
+
+def index_variant(index_type: str = INDEX_TYPE, metric: str = INDEX_METRIC) -> str:
+    """Describes the index settings, for inclusion in cache and corpus variants."""
+    if index_type in _EXHAUSTIVE_TYPES:
+        return f"{index_type}-{metric}"
+    return f"{index_type}-{metric}-min{ANN_MIN_VECTORS}-nlist{IVF_NLIST}-m{HNSW_M}-efc{EF_CONSTRUCTION}-pq{PQ_M}"
+
+
+def prepare_vectors(vectors: np.ndarray, metric: str = INDEX_METRIC) -> np.ndarray:
+    """
+    Returns contiguous float32 vectors, L2-normalised when the metric is cosine.
+    Vectors that are already contiguous float32 are only copied to be normalised,
+    so building an index does not hold another full copy of the embeddings.
+    """
+    if metric == "cosine":
+        import faiss
+        vectors = np.array(vectors, dtype=np.float32, order="C", copy=True)
+        faiss.normalize_L2(vectors)
+        return vectors
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _nlist_for(n: int) -> int:
+    if IVF_NLIST > 0:
+        return IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(n)), n // _MIN_POINTS_PER_CENTROID))
+
+
+def build_index(
+    embeddings: np.ndarray,
+    index_type: str = INDEX_TYPE,
+    metric: str = INDEX_METRIC,
+    min_vectors: int = ANN_MIN_VECTORS
+) -> Any:
+    """
+    Builds, trains (when needed) and fills an index with the given embeddings.
+
+    Args:
+        embeddings: A (n, d) array of embeddings.
+        index_type: One of `INDEX_TYPES`.
+        metric: 'l2', 'ip' (inner product) or 'cosine' (inner product on normalised vectors).
+        min_vectors: Approximate indexes fall back to flat below this many vectors.
+
+    Returns:
+        A FAISS index ready for `search`.
+    """
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}.")
+    if metric not in INDEX_METRICS:
+        raise ValueError(f"Unknown index metric '{metric}', expected one of {INDEX_METRICS}.")
+
+    vectors = prepare_vectors(embeddings, metric)
+    n, d = vectors.shape
+    faiss_metric = faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+
+    if index_type not in _EXHAUSTIVE_TYPES and n < max(min_vectors, 1):
+        # Keep the vector compression of an IVF index with 8-bit codes.
+        index_type = "sq8" if index_type == "ivfsq8" else "flat"
+    if index_type == "ivfpq" and (n < _PQ_CENTROIDS or d % PQ_M != 0):
+        # Not enough vectors to train the PQ codebooks, or dimensions do not split evenly.
+        index_type = "ivf"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(d) if faiss_metric == faiss.METRIC_L2 else faiss.IndexFlatIP(d)
+    elif index_type in ("sqfp16", "sq8"):
+        index = faiss.index_factory(d, _SQ_CODES[index_type], faiss_metric)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, HNSW_M, faiss_metric)
+        index.hnsw.efConstruction = EF_CONSTRUCTION
+    elif index_type in ("ivf", "ivfsq8"):
+        index = faiss.index_factory(d, f"IVF{_nlist_for(n)},{_SQ_CODES.get(index_type, 'Flat')}", faiss_metric)
+    else:
+        index = faiss.index_factory(d, f"IVF{_nlist_for(n)},PQ{PQ_M}", faiss_metric)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    configure_search(index)
+    return index
+
+
+def configure_search(index: Any, nprobe: int = NPROBE, ef_search: int = EF_SEARCH) -> None:
+    """Applies the search-time knobs (IVF `nprobe`, HNSW `efSearch`) to an index."""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search
+
+
+def vector_bytes(index: Any) -> int:
+    """Memory taken by the vectors stored in an index (its codes, for quantized indexes)."""
+    try:
+        return index.ntotal * index.sa_code_size()
+    except RuntimeError:
+        # Not every index type (e.g. HNSW) reports a code size.
+        return index.ntotal * index.d * 4
+
+
+def search(index: Any, queries: np.ndarray, k: int, metric: str = INDEX_METRIC):
+    """Searches an index built by `build_index`, preparing the queries for its metric."""
+    return index.search(prepare_vectors(queries, metric), min(k, index.ntotal))
+
+
+def recall_latency_report(
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    k: int = 3,
+    metric: str = INDEX_METRIC,
+    nprobes: Optional[List[int]] = None,
+    ef_searches: Optional[List[int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Measures recall@k against exact search, and per-query latency, for every
+    index type over a sweep of its search parameters. Approximate indexes are
+    always built here (no flat fallback) so small corpora can still be compared.
+
+    Returns:
+        One row per (index type, parameter) with recall, latency percentiles,
+        build time and index size.
+    """
+    import faiss
+
+    nprobes = nprobes or [1, 2, 4, 8, 16, 32]
+    ef_searches = ef_searches or [16, 32, 64, 128, 256]
+
+    exact = build_index(embeddings, "flat", metric)
+    _, truth = search(exact, queries, k, metric)
+
+    rows = []
+    for index_type in INDEX_TYPES:
+        started = time.perf_counter()
+        try:
+            index = build_index(embeddings, index_type, metric, min_vectors=0)
+        except RuntimeError as e:
+            rows.append({"index_type": index_type, "error": str(e)})
+            continue
+        build_seconds = time.perf_counter() - started
+        size_bytes = faiss.serialize_index(index).nbytes
+
+        if index_type in ("ivf", "ivfsq8", "ivfpq"):
+            sweep = [("nprobe", value) for value in nprobes]
+        elif index_type == "hnsw":
+            sweep = [("efSearch", value) for value in ef_searches]
+        else:
+            sweep = [(None, None)]
+
+        for param, value in sweep:
+            if param == "nprobe":
+                configure_search(index, nprobe=value)
+            elif param == "efSearch":
+                configure_search(index, ef_search=value)
+
+            latencies = []
+            hits = 0
+            for i in range(len(queries)):
+                started = time.perf_counter()
+                _, found = search(index, queries[i:i + 1], k, metric)
+                latencies.append((time.perf_counter() - started) * 1000)
+                hits += len(set(found[0]) & set(truth[i]))
+
+            rows.append({
+                "index_type": index_type,
+                "metric": metric,
+                "param": param,
+                "value": value,
+                f"recall_at_{k}": hits / (len(queries) * truth.shape[1]),
+                "latency_ms_p50": float(np.percentile(latencies, 50)),
+                "latency_ms_p95": float(np.percentile(latencies, 95)),
+                "build_seconds": build_seconds,
+                "size_bytes": int(size_bytes),
+                "bytes_per_vector": size_bytes / max(index.ntotal, 1)
+            })
+    return rows
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from . import chunk_store, chunking, document_cache, index_factory, pdf_extraction, retrieval, tracing
+from .answer_cache import answer_cache
+from .embeddings import EMBEDDING_MODEL_NAME, get_embedding_model
+
+# --- Async Document Ingestion ---
+#
+# Downloads go through a pooled async HTTP client, and PDF parsing, embedding
+# and cache I/O run on a small worker pool, so ingesting one large PDF never
+# blocks the event loop that serves every other session's turns.
+
+INGEST_WORKERS = int(os.environ.get("RAG_INGEST_WORKERS", 2))
+DOWNLOAD_TIMEOUT_SECONDS = float(os.environ.get("RAG_DOWNLOAD_TIMEOUT_SECONDS", 30))
+EMBED_BATCH_SIZE = int(os.environ.get("RAG_EMBED_BATCH_SIZE", 64))
+
+# Identifies how cached documents were built. Change it whenever extraction,
+# chunking, embedding or indexing changes so old cache entries are not reused.
+CACHE_VARIANT = (
+    f"{EMBEDDING_MODEL_NAME}:{chunking.chunker_variant()}:{index_factory.index_variant()}:"
+    f"{chunk_store.FORMAT}:{document_cache.EMBEDDINGS_DTYPE}"
+)
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="rag-ingest")
+
+# The HTTP client's connection pool is bound to the event loop it was created on.
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Documents currently being built, so concurrent requests for one PDF share the work.
+_inflight: Dict[str, "asyncio.Future[Tuple[Dict[str, Any], str]]"] = {}
+
+
+def build_document(pdf_bytes: bytes) -> Tuple[str, chunk_store.ChunkStore, np.ndarray, Any]:
+    """
+    Runs the full extraction, chunking, embedding and indexing pipeline on a PDF.
+    Pages stream in from the extraction pool and are chunked and embedded in
+    batches as they arrive; the index type and metric come from `index_factory`.
+    This is CPU-bound and blocking; call it from a worker thread.
+
+    Returns:
+        A tuple of (text, chunks, embeddings, index). `chunks` is a ChunkStore;
+        each chunk is a dictionary with its `text`, the `page` it starts on and
+        its `section` heading. `chunks` is empty if no text was found. The
+        embeddings are in the cache's storage dtype (`RAG_EMBEDDINGS_DTYPE`).
+    """
+    with tracing.span("document.build", pdf_bytes=len(pdf_bytes)) as build_span:
+        return _build_document(pdf_bytes, build_span)
+
+
+def _build_document(pdf_bytes: bytes, build_span: tracing.Span) -> Tuple[str, chunk_store.ChunkStore, np.ndarray, Any]:
+    embedding_model = get_embedding_model()
+    # Chunks must fit the model's sequence length, or their tails are silently truncated.
+    chunker = chunking.Chunker(
+        chunking.token_counter(embedding_model),
+        max_tokens=min(chunking.CHUNK_MAX_TOKENS, embedding_model.max_seq_length - 2)
+    )
+    pages: List[str] = []
+    chunks: List[Dict[str, Any]] = []
+    embedding_batches: List[np.ndarray] = []
+    embedded = 0
+
+    def embed_pending() -> None:
+        nonlocal embedded
+        pending = chunks[embedded:]
+        if pending:
+            with tracing.span("document.embed", chunks=len(pending)):
+                embedding_batches.append(
+                    embedding_model.encode([chunk["text"] for chunk in pending], convert_to_numpy=True)
+                )
+            embedded = len(chunks)
+
+    # 1. Extract Text page by page using pdfplumber
+    extract_wait = 0.0
+    waiting_since = time.perf_counter()
+    for page_number, page_text in pdf_extraction.iter_pages(pdf_bytes):
+        extract_wait += time.perf_counter() - waiting_since
+        pages.append(page_text)
+
+        # 2. Text Chunking (headings, lists and tables kept intact, bounded by tokens)
+        chunks.extend(chunker.add_page(page_number, page_text))
+
+        # 3. Create Embeddings in batches while later pages are still being extracted
+        if len(chunks) - embedded >= EMBED_BATCH_SIZE:
+            embed_pending()
+        waiting_since = time.perf_counter()
+    chunks.extend(chunker.finish())
+    embed_pending()
+
+    # Time spent waiting on the extraction pool, i.e. not overlapped with chunking and embedding.
+    build_span.set_attributes(pages=len(pages), chunks=len(chunks), extract_wait_ms=extract_wait * 1000)
+    text_content = "\n".join(pages)
+    if not chunks:
+        return text_content, chunk_store.ChunkStore.from_chunks([]), None, None
+
+    # 4. Build the Vector Store (FAISS). Approximate indexes need every vector up front for training.
+    embeddings_np = np.vstack(embedding_batches)
+    embedding_batches.clear()
+    with tracing.span("index.build", vectors=len(embeddings_np), index_type=index_factory.INDEX_TYPE):
+        index = index_factory.build_index(embeddings_np)
+    # Only the index is searched; the embeddings are kept for the cache and corpus reports.
+    embeddings_np = embeddings_np.astype(document_cache.EMBEDDINGS_DTYPE, copy=False)
+    return text_content, chunk_store.ChunkStore.from_chunks(chunks), embeddings_np, index
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=True)
+        _http_client_loop = loop
+    return _http_client
+
+
+async def _download(pdf_url: str, headers: Dict[str, str]) -> httpx.Response:
+    with tracing.span("pdf.download", url=pdf_url, conditional=bool(headers)) as span:
+        response = await _get_http_client().get(pdf_url, headers=headers)
+        span.set_attributes(status_code=response.status_code, bytes=len(response.content))
+    return response
+
+
+async def fetch_document(pdf_url: str) -> Tuple[str, Optional[bytes]]:
+    """
+    Downloads a PDF, revalidating against the document cache when possible.
+
+    Returns:
+        A tuple of (document key, PDF bytes). The bytes are None when the server
+        confirmed with `304 Not Modified` that the cached document is current.
+    """
+    response = await _download(pdf_url, document_cache.conditional_headers(pdf_url, CACHE_VARIANT))
+    if response.status_code == 304:
+        record = document_cache.lookup_url(pdf_url)
+        if record is not None:
+            return document_cache.entry_key(record["content_hash"], CACHE_VARIANT), None
+        # The URL's cache record was lost since the request was sent; fetch the PDF itself.
+        response = await _download(pdf_url, {})
+
+    response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
+    pdf_hash = document_cache.content_hash(response.content)
+    document_cache.remember_url(
+        pdf_url,
+        pdf_hash,
+        response.headers.get("ETag"),
+        response.headers.get("Last-Modified")
+    )
+    return document_cache.entry_key(pdf_hash, CACHE_VARIANT), response.content
+
+
+async def _load_document(pdf_url: str, key: str, pdf_bytes: Optional[bytes]) -> Tuple[Dict[str, Any], str]:
+    with tracing.span("document.load", key=key) as span:
+        document, source = await _load_or_build(pdf_url, key, pdf_bytes)
+        span.set_attributes(cache_hit=source == "loaded cached", chunks=len(document["chunks"]))
+        return document, source
+
+
+async def _load_or_build(pdf_url: str, key: str, pdf_bytes: Optional[bytes]) -> Tuple[Dict[str, Any], str]:
+    loop = asyncio.get_running_loop()
+    entry = await loop.run_in_executor(_executor, document_cache.load_entry, key)
+    if entry is not None:
+        entry["key"] = key
+        await loop.run_in_executor(_executor, retrieval.ensure_sparse_index, entry)
+        return entry, "loaded cached"
+
+    if pdf_bytes is None:
+        # The entry was evicted between the conditional request and the load.
+        with tracing.span("pdf.download", url=pdf_url, conditional=False) as span:
+            response = await _get_http_client().get(pdf_url)
+            span.set_attributes(status_code=response.status_code, bytes=len(response.content))
+        response.raise_for_status()
+        pdf_bytes = response.content
+
+    # Worker threads do not inherit context variables; `tracing.bind` carries the current span over.
+    text_content, chunks, embeddings_np, index = await loop.run_in_executor(
+        _executor, tracing.bind(build_document), pdf_bytes
+    )
+    if not chunks:
+        raise ValueError("Could not extract text from the PDF.")
+    with tracing.span("document.store", chunks=len(chunks)):
+        await loop.run_in_executor(
+            _executor, document_cache.store_entry, key, text_content, chunks, embeddings_np, index
+        )
+    # Contexts cached for an earlier build of this document may no longer match its chunks.
+    answer_cache.invalidate(key)
+    document = {"key": key, "chunks": chunks, "embeddings": embeddings_np, "index": index}
+    await loop.run_in_executor(_executor, retrieval.ensure_sparse_index, document)
+    return document, "processed"
+
+
+async def load_document(pdf_url: str, key: str, pdf_bytes: Optional[bytes]) -> Tuple[Dict[str, Any], str]:
+    """
+    Loads a document from the cache, or builds it off the event loop on a miss.
+    Concurrent calls for the same document key wait on a single build.
+
+    Returns:
+        A tuple of (document, source), where document has its `key`, `chunks`,
+        `embeddings`, `index` and `bm25` index, and source describes where it came from.
+    """
+    future = _inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_load_document(pdf_url, key, pdf_bytes))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shield the shared build so one cancelled caller does not cancel it for the others.
+    return await asyncio.shield(future)
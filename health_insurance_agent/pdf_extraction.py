@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# --- Page-parallel PDF Extraction ---
+#
+# pdfplumber is pure Python and holds the GIL, so pages are extracted in a
+# process pool. Each task extracts a small range of pages, and results are
+# yielded in page order as soon as each range is ready, letting chunking and
+# embedding start long before the last page has been parsed. The PDF is written
+# to a temporary file once and tasks only carry its path and their page range,
+# rather than each pickling a copy of the whole document to the pool.
+
+EXTRACT_WORKERS = int(os.environ.get("RAG_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+PAGES_PER_TASK = int(os.environ.get("RAG_EXTRACT_PAGES_PER_TASK", 4))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # Spawn rather than fork: the parent has torch and worker threads running.
+        _process_pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def _extract_pages(source: Union[bytes, str], start: int, end: int) -> List[Tuple[int, str]]:
+    """Extracts pages [start, end) of a PDF (bytes or a file path) and returns (1-based page number, text) pairs."""
+    import pdfplumber
+
+    with pdfplumber.open(BytesIO(source) if isinstance(source, bytes) else source) as pdf:
+        # extract_text() returns None for pages without a text layer.
+        return [(n + 1, pdf.pages[n].extract_text() or "") for n in range(start, end)]
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    import pdfplumber
+
+    with pdfplumber.open(BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pages(pdf_bytes: bytes) -> Iterator[Tuple[int, str]]:
+    """
+    Yields (page number, text) for every page of a PDF, in page order.
+
+    Small documents, or a configuration with a single worker, are extracted in
+    the calling process to avoid the cost of shipping the PDF to the pool.
+    """
+    page_count = count_pages(pdf_bytes)
+    if EXTRACT_WORKERS <= 1 or page_count <= PAGES_PER_TASK:
+        yield from _extract_pages(pdf_bytes, 0, page_count)
+        return
+
+    with tempfile.NamedTemporaryFile(prefix="rag-extract-", suffix=".pdf", delete=False) as f:
+        f.write(pdf_bytes)
+    pending = set()
+    ready: Dict[int, str] = {}
+    next_page = 1
+    try:
+        pool = _get_process_pool()
+        pending = {
+            pool.submit(_extract_pages, f.name, start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ready.update(future.result())
+            # Only hand out pages once every earlier page is available.
+            while next_page in ready:
+                yield next_page, ready.pop(next_page)
+                next_page += 1
+    finally:
+        for future in pending:
+            future.cancel()
+        # Tasks still running after a cancellation have their results discarded.
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from . import index_factory
+
+# --- Session-scoped Document Store ---
+#
+# Each ADK session works with its own product document, but many sessions end
+# up asking about the same handful of PDFs. Sessions therefore only hold a
+# reference to a shared document (FAISS index + chunks), and a document is
+# dropped once the last session referencing it is released or evicted.
+
+SESSION_IDLE_SECONDS = float(os.environ.get("RAG_SESSION_IDLE_SECONDS", 30 * 60))
+STORE_MAX_BYTES = int(os.environ.get("RAG_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def estimate_document_bytes(document: Dict[str, Any]) -> int:
+    """Roughly estimates the size of a loaded document (index vectors, embeddings, chunk text and BM25 postings)."""
+    index = document.get("index")
+    vector_bytes = index_factory.vector_bytes(index) if index is not None else 0
+    embedding_bytes = document["embeddings"].nbytes if document.get("embeddings") is not None else 0
+    text_bytes = document["chunks"].nbytes if document.get("chunks") is not None else 0
+    sparse_bytes = document["bm25"].nbytes if document.get("bm25") is not None else 0
+    return vector_bytes + embedding_bytes + text_bytes + sparse_bytes
+
+
+class DocumentStore:
+    """
+    Maps session ids to reference-counted, shared documents.
+
+    Idle sessions are evicted after `max_idle_seconds`, and the least recently
+    used sessions are evicted whenever the loaded documents exceed `max_bytes`.
+    """
+
+    def __init__(self, max_idle_seconds: float = SESSION_IDLE_SECONDS, max_bytes: int = STORE_MAX_BYTES):
+        self.max_idle_seconds = max_idle_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # document key -> {"document": {...}, "refcount": int, "nbytes": int}
+        self._documents: Dict[str, Dict[str, Any]] = {}
+        # session id -> {"document_key": str, "last_access": float}, least recently used first
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._total_bytes = 0
+
+    def has_document(self, document_key: str) -> bool:
+        with self._lock:
+            return document_key in self._documents
+
+    def attach(self, session_id: str, document_key: str, loader: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Points a session at a document, loading it with `loader` only if no other
+        session already holds it. Any document the session held before is released.
+
+        Returns:
+            The shared document dictionary (with at least `index` and `chunks`).
+
+        Raises:
+            ValueError: If the document is not held and `loader` returns None.
+        """
+        document = None
+        while True:
+            with self._lock:
+                shared = self._documents.get(document_key)
+                if shared is None and document is not None:
+                    shared = {"document": document, "refcount": 0, "nbytes": estimate_document_bytes(document)}
+                    self._documents[document_key] = shared
+                    self._total_bytes += shared["nbytes"]
+                if shared is not None:
+                    # Take the new reference before releasing the old one, in case they are the same document.
+                    shared["refcount"] += 1
+                    self._release_locked(session_id)
+                    self._sessions[session_id] = {"document_key": document_key, "last_access": time.time()}
+                    self._evict_locked(keep=session_id)
+                    return shared["document"]
+            # Load outside the lock so a slow load does not block other sessions.
+            document = loader()
+            if document is None:
+                raise ValueError(f"Document {document_key} is not loaded and the loader returned none.")
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Returns the session's document, or None if it has none or was evicted."""
+        with self._lock:
+            self._evict_locked(keep=session_id)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            session["last_access"] = time.time()
+            self._sessions.move_to_end(session_id)
+            return self._documents[session["document_key"]]["document"]
+
+    def release(self, session_id: str) -> None:
+        """Drops a session, freeing its document if no other session uses it."""
+        with self._lock:
+            self._release_locked(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "documents": len(self._documents),
+                "bytes": self._total_bytes
+            }
+
+    def _release_locked(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        key = session["document_key"]
+        shared = self._documents[key]
+        shared["refcount"] -= 1
+        if shared["refcount"] <= 0:
+            del self._documents[key]
+            self._total_bytes -= shared["nbytes"]
+
+    def _evict_locked(self, keep: Optional[str] = None) -> None:
+        cutoff = time.time() - self.max_idle_seconds
+        for session_id in list(self._sessions):
+            if session_id != keep and self._sessions[session_id]["last_access"] < cutoff:
+                self._release_locked(session_id)
+
+        for session_id in list(self._sessions):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if session_id != keep:
+                self._release_locked(session_id)
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import index_factory, tracing
+from .bm25 import BM25Index
+
+# --- Hybrid Retrieval ---
+#
+# `answer_from_product_document` retrieves chunks in one of three modes:
+#
+#   - dense:  FAISS search over the chunk embeddings
+#   - sparse: BM25 over the chunk texts (exact terms, amounts, item numbers)
+#   - hybrid: both shortlists merged with reciprocal-rank fusion (RRF)
+#
+# Optionally a cross-encoder re-scores the fused shortlist. It is the only
+# expensive step, so it is loaded lazily in the background, and it only scores
+# as many candidates as fit in what is left of the latency budget.
+
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+
+RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_K = int(os.environ.get("RAG_RETRIEVAL_K", 3))
+MAX_RETRIEVAL_K = 10
+# Candidates taken from each retriever before fusion.
+RETRIEVAL_CANDIDATES = int(os.environ.get("RAG_RETRIEVAL_CANDIDATES", 20))
+RRF_K = int(os.environ.get("RAG_RRF_K", 60))
+
+RERANK = os.environ.get("RAG_RERANK", "0") == "1"
+RERANKER_MODEL_NAME = os.environ.get("RAG_RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_MAX_CANDIDATES = int(os.environ.get("RAG_RERANK_MAX_CANDIDATES", 12))
+RETRIEVAL_BUDGET_MS = float(os.environ.get("RAG_RETRIEVAL_BUDGET_MS", 250))
+
+_reranker: Optional[Any] = None
+_reranker_lock = threading.Lock()
+_reranker_loading = False
+_reranker_failed = False
+# Moving average of cross-encoder cost per candidate, used to size the shortlist.
+_rerank_ms_per_candidate = 10.0
+
+
+def ensure_sparse_index(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the document's BM25 index from its chunks, if it does not have one yet."""
+    if document.get("bm25") is None:
+        document["bm25"] = BM25Index(list(document["chunks"].texts()))
+    return document
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], rrf_k: int = RRF_K) -> List[int]:
+    """Merges ranked lists of chunk ids, scoring each id by the sum of 1 / (rrf_k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[int(chunk_id)] = scores.get(int(chunk_id), 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda chunk_id: -scores[chunk_id])
+
+
+def _load_reranker() -> None:
+    global _reranker, _reranker_loading, _reranker_failed
+    try:
+        from sentence_transformers import CrossEncoder
+        model = CrossEncoder(RERANKER_MODEL_NAME)
+        with _reranker_lock:
+            _reranker = model
+    except Exception as e:
+        # Retrieval carries on without reranking rather than retrying the download on every question.
+        print(f"Error loading reranker: {e}")
+        _reranker_failed = True
+    finally:
+        with _reranker_lock:
+            _reranker_loading = False
+
+
+def get_reranker() -> Optional[Any]:
+    """
+    Returns the cross-encoder if it is loaded. Otherwise starts loading it in a
+    background thread and returns None, so the first requests are not blocked on it.
+    """
+    global _reranker_loading
+    with _reranker_lock:
+        if _reranker is None and not _reranker_loading and not _reranker_failed:
+            _reranker_loading = True
+            threading.Thread(target=_load_reranker, name="rag-reranker-load", daemon=True).start()
+        return _reranker
+
+
+def _rerank(
+    question: str,
+    chunks: List[Dict[str, Any]],
+    candidates: List[int],
+    budget_ms: float,
+    span: tracing.Span
+) -> Tuple[List[int], bool]:
+    """Reorders the candidates with the cross-encoder, if loaded and affordable; returns them and whether it did."""
+    global _rerank_ms_per_candidate
+    reranker = get_reranker()
+    affordable = int(budget_ms / _rerank_ms_per_candidate)
+    if reranker is None or affordable < 2:
+        span.set_attributes(scored=0, skipped="model loading" if reranker is None else "over budget")
+        return candidates, False
+
+    shortlist = candidates[:min(affordable, RERANK_MAX_CANDIDATES)]
+    span.set_attribute("scored", len(shortlist))
+    started = time.perf_counter()
+    scores = reranker.predict([(question, chunks[i]["text"]) for i in shortlist])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    _rerank_ms_per_candidate = 0.8 * _rerank_ms_per_candidate + 0.2 * elapsed_ms / len(shortlist)
+
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    return [shortlist[i] for i in order] + candidates[len(shortlist):], True
+
+
+def retrieve(
+    document: Dict[str, Any],
+    question: str,
+    question_embedding: np.ndarray,
+    k: int = RETRIEVAL_K,
+    mode: str = RETRIEVAL_MODE,
+    rerank: bool = RERANK
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Retrieves the chunks of a document most relevant to a question.
+
+    Args:
+        document: A loaded document with `chunks` and `index` (and `bm25`, built here if missing).
+        question: The question text, used by BM25 and the reranker.
+        question_embedding: The question's embedding, used by the dense index.
+        k: How many chunks to return.
+        mode: One of 'dense', 'sparse' or 'hybrid'.
+        rerank: Whether to re-score the shortlist with the cross-encoder.
+
+    Returns:
+        Up to `k` chunks, most relevant first, and whether they were reranked (which
+        is skipped while the cross-encoder loads or when the time budget is spent).
+        Blocking; call it from a worker thread.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}.")
+    started = time.perf_counter()
+    candidates_per_list = max(RETRIEVAL_CANDIDATES, k)
+
+    rankings = []
+    if mode in ("dense", "hybrid"):
+        with tracing.span("index.search", vectors=document["index"].ntotal, k=candidates_per_list):
+            _, indices = index_factory.search(document["index"], question_embedding.reshape(1, -1), candidates_per_list)
+        rankings.append(indices[0][indices[0] >= 0])
+    if mode in ("sparse", "hybrid"):
+        with tracing.span("bm25.search", chunks=len(document["chunks"])) as span:
+            _, ids = ensure_sparse_index(document)["bm25"].search(question, candidates_per_list)
+            span.set_attribute("matches", len(ids))
+        rankings.append(ids)
+
+    candidates = reciprocal_rank_fusion(rankings)
+    reranked = False
+    if rerank and len(candidates) > 1:
+        remaining_ms = RETRIEVAL_BUDGET_MS - (time.perf_counter() - started) * 1000
+        with tracing.span("rerank", candidates=len(candidates), budget_ms=remaining_ms) as span:
+            candidates, reranked = _rerank(question, document["chunks"], candidates, remaining_ms, span)
+    return [document["chunks"][i] for i in candidates[:k]], reranked
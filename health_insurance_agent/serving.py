@@ -0,0 +1,238 @@
+import asyncio
+import gc
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import zlib
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+# --- Multi-worker Serving ---
+#
+# CPU-bound work (question encoding, PDF parsing, embedding, index search) caps
+# a single process at one core. `WorkerPool` runs agent turns in several worker
+# processes behind a dispatcher in the app process:
+#
+#   - fork after load: the app process loads the embedding model, the product
+#     catalogue and the pre-built corpus shards once, then forks the workers,
+#     which share those pages copy-on-write (corpus shards are memory-mapped
+#     files, so they are shared through the page cache as well)
+#   - sticky routing: a session always goes to the same worker, which holds the
+#     session's processed document in its `DocumentStore`; the conversation
+#     history itself lives in the shared SQLite session database
+#   - streaming: each worker runs many turns concurrently on its own event
+#     loop and sends every partial response back to the dispatcher
+#   - replacement: a worker that dies fails the turns it was running, and is
+#     re-forked from the app process on the next turn routed to it, so its
+#     sessions keep their worker (they reload their document if they need it)
+#
+# Workers are forked, so they need no picklable entry point, but they must be
+# started before the app process starts any threads (e.g. before the UI launches).
+
+SERVING_WORKERS = int(os.environ.get("RAG_SERVING_WORKERS", 0))
+# Seconds between liveness checks of the worker serving a turn.
+_LIVENESS_INTERVAL = 1.0
+
+# Called in the worker as handler(message, session_id); yields the response so far.
+TurnHandler = Callable[[str, str], AsyncIterator[str]]
+
+
+def worker_for(session_id: str, workers: int) -> int:
+    """Returns the index of the worker that serves a session (stable across restarts)."""
+    return zlib.crc32(session_id.encode("utf-8")) % workers
+
+
+def preload() -> None:
+    """Loads everything workers share read-only: the embedding model, the catalogue and the corpus."""
+    from . import catalogue, embeddings
+    from .corpus_index import product_corpus
+
+    embeddings.warm_up()
+    catalogue.get_catalogue()
+    shards = product_corpus.preload()
+    print(f"Preloaded the embedding model, the product catalogue and {shards} corpus shards.")
+
+
+def _limit_threads(threads: int) -> None:
+    # Each worker gets its share of the cores for torch and FAISS intra-op threads,
+    # and for its PDF extraction pool (created lazily, so after this runs).
+    from . import pdf_extraction
+
+    pdf_extraction.EXTRACT_WORKERS = min(pdf_extraction.EXTRACT_WORKERS, threads)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+    if "faiss" in sys.modules:
+        sys.modules["faiss"].omp_set_num_threads(threads)
+
+
+async def _handle(request: Tuple[int, str, str], responses: Any, handler: TurnHandler) -> None:
+    request_id, session_id, message = request
+    try:
+        async for text in handler(message, session_id):
+            responses.put((request_id, "chunk", text))
+        responses.put((request_id, "done", None))
+    except Exception as e:
+        responses.put((request_id, "error", f"{type(e).__name__}: {e}"))
+
+
+async def _serve(requests: Any, responses: Any, handler: TurnHandler) -> None:
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    while True:
+        request = await loop.run_in_executor(None, requests.get)
+        if request is None:
+            break
+        task = asyncio.ensure_future(_handle(request, responses, handler))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _worker_main(
+    requests: Any,
+    responses: Any,
+    handler: TurnHandler,
+    initializer: Optional[Callable[[], None]],
+    threads: int
+) -> None:
+    _limit_threads(threads)
+    if initializer is not None:
+        initializer()
+    asyncio.run(_serve(requests, responses, handler))
+
+
+class WorkerPool:
+    """Dispatches agent turns to forked worker processes, routing each session to one worker."""
+
+    def __init__(
+        self,
+        handler: TurnHandler,
+        workers: int = SERVING_WORKERS,
+        initializer: Optional[Callable[[], None]] = None,
+        preloader: Optional[Callable[[], None]] = preload
+    ):
+        """
+        Args:
+            handler: Async generator function run in the workers for each turn.
+            workers: Number of worker processes.
+            initializer: Called once in each worker after the fork, e.g. to open
+                per-process resources such as database connections.
+            preloader: Called once in the app process before forking, to load
+                what the workers share.
+        """
+        self.handler = handler
+        self.workers = max(workers, 1)
+        self.initializer = initializer
+        self.preloader = preloader
+        self._context = multiprocessing.get_context("fork")
+        self._processes: List[Any] = []
+        self._requests: List[Any] = []
+        self._responses: Any = None
+        self._reader: Optional[threading.Thread] = None
+        self._ids = itertools.count()
+        self._threads = 1
+        self._lock = threading.Lock()
+        # request id -> (event loop of the caller, queue of its responses)
+        self._pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+
+    def start(self) -> None:
+        """Preloads shared state and forks the workers. Call before starting any threads."""
+        if self.preloader is not None:
+            self.preloader()
+        self._threads = max(1, (os.cpu_count() or 1) // self.workers)
+
+        # Objects that exist now are shared by every worker; moving them out of the
+        # garbage collector's reach stops collections from copying their pages.
+        gc.collect()
+        gc.freeze()
+        self._responses = self._context.Queue()
+        for i in range(self.workers):
+            requests, process = self._fork_worker(i)
+            self._requests.append(requests)
+            self._processes.append(process)
+        gc.unfreeze()
+
+        self._reader = threading.Thread(target=self._read_responses, name="rag-dispatcher", daemon=True)
+        self._reader.start()
+
+    def _fork_worker(self, worker: int) -> Tuple[Any, Any]:
+        requests = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(requests, self._responses, self.handler, self.initializer, self._threads),
+            name=f"rag-worker-{worker}",
+            daemon=True
+        )
+        process.start()
+        return requests, process
+
+    def _ensure_worker(self, worker: int) -> None:
+        """Replaces the worker with a fresh fork of the app process if it has died."""
+        with self._lock:
+            process = self._processes[worker]
+            if process.is_alive():
+                return
+            print(f"Worker {worker} exited with code {process.exitcode}; starting a replacement.")
+            process.join()
+            # Turns still queued for the dead worker have already failed in `submit`.
+            self._requests[worker].close()
+            self._requests[worker].cancel_join_thread()
+            self._requests[worker], self._processes[worker] = self._fork_worker(worker)
+
+    @property
+    def pids(self) -> List[int]:
+        return [process.pid for process in self._processes]
+
+    async def submit(self, session_id: str, message: str) -> AsyncIterator[str]:
+        """Runs a turn on the session's worker, yielding the response so far as it streams in."""
+        worker = worker_for(session_id, self.workers)
+        self._ensure_worker(worker)
+        process = self._processes[worker]
+        request_id = next(self._ids)
+        results: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = (asyncio.get_running_loop(), results)
+        try:
+            self._requests[worker].put((request_id, session_id, message))
+            while True:
+                try:
+                    kind, value = await asyncio.wait_for(results.get(), _LIVENESS_INTERVAL)
+                except asyncio.TimeoutError:
+                    if not process.is_alive():
+                        raise RuntimeError(f"Worker {worker} exited with code {process.exitcode}.")
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise RuntimeError(value)
+                else:
+                    return
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _read_responses(self) -> None:
+        while True:
+            response = self._responses.get()
+            if response is None:
+                return
+            request_id, kind, value = response
+            pending = self._pending.get(request_id)
+            if pending is None:
+                # The caller stopped listening, e.g. the browser tab was closed.
+                continue
+            loop, results = pending
+            loop.call_soon_threadsafe(results.put_nowait, (kind, value))
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Lets the workers finish their turns and exit, then stops the dispatcher."""
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        if self._responses is not None:
+            self._responses.put(None)
+        if self._reader is not None:
+            self._reader.join(timeout)
+        self._processes, self._requests = [], []
@@ -0,0 +1,430 @@
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+
+# --- SQLite Session Service ---
+#
+# A drop-in replacement for ADK's InMemorySessionService that keeps sessions in
+# a local SQLite database instead of process memory:
+#
+#   - WAL mode, so several worker processes can read while one writes
+#   - a small pool of connections shared by the worker threads doing the I/O
+#   - events are buffered per session and written in one transaction when the
+#     agent's final response for the turn arrives, not one write per event
+#   - each session keeps at most `max_events` events, trimmed at a user message
+#     so a function call is never separated from its response
+#   - sessions idle for longer than `ttl_seconds` are deleted
+#   - a turn that fails before its final response never has its buffered events
+#     written: the app calls `discard_pending`, and buffers left behind (e.g. by
+#     a cancelled turn) are dropped after `_PENDING_MAX_SECONDS`
+#
+# Session state lives in the sessions table; `app:` and `user:` prefixed state
+# is shared through the app_states and user_states tables, as ADK expects.
+
+SESSION_DB_PATH = os.environ.get(
+    "RAG_SESSION_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sessions.sqlite3")
+)
+SESSION_DB_POOL_SIZE = int(os.environ.get("RAG_SESSION_DB_POOL_SIZE", 4))
+SESSION_TTL_SECONDS = float(os.environ.get("RAG_SESSION_TTL_SECONDS", 7 * 24 * 60 * 60))
+SESSION_MAX_EVENTS = int(os.environ.get("RAG_SESSION_MAX_EVENTS", 200))
+# Pending events that force a write even before the turn's final response.
+SESSION_FLUSH_EVENTS = int(os.environ.get("RAG_SESSION_FLUSH_EVENTS", 32))
+# How often expired sessions are looked for, piggybacking on session creation.
+_EXPIRY_CHECK_SECONDS = 60
+# Buffered events older than this belong to a turn that will never finish.
+_PENDING_MAX_SECONDS = 15 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE INDEX IF NOT EXISTS sessions_update_time ON sessions (update_time);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    author TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+SessionKey = Tuple[str, str, str]
+
+
+def _split_state(state: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Splits merged session state into (app, user, session) state, dropping temp keys."""
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in state.items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key[len(State.APP_PREFIX):]] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key[len(State.USER_PREFIX):]] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+class SqliteSessionService(BaseSessionService):
+    """ADK session service backed by a local SQLite database."""
+
+    def __init__(
+        self,
+        db_path: str = SESSION_DB_PATH,
+        pool_size: int = SESSION_DB_POOL_SIZE,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        max_events: int = SESSION_MAX_EVENTS,
+        flush_events: int = SESSION_FLUSH_EVENTS
+    ):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_events = max_events
+        self.flush_events = flush_events
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(pool_size, 1)):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            conn.executescript(_SCHEMA)
+
+        self._lock = threading.Lock()
+        # Session key -> (latest session object, events not yet written, when the first was buffered)
+        self._pending: Dict[SessionKey, Tuple[Session, List[Event], float]] = {}
+        self._last_expiry_check = 0.0
+        self._last_pending_check = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss, never corruption.
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # --- BaseSessionService ---
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        await asyncio.to_thread(self._maybe_expire)
+        return await asyncio.to_thread(self._create_session, app_name, user_id, session_id, state or {})
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None
+    ) -> Optional[Session]:
+        # Read your own writes: events still buffered for this session are written first.
+        await self._flush((app_name, user_id, session_id))
+        return await asyncio.to_thread(self._get_session, app_name, user_id, session_id, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await asyncio.to_thread(self._list_sessions, app_name, user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        with self._lock:
+            self._pending.pop((app_name, user_id, session_id), None)
+        await asyncio.to_thread(self._delete_session, app_name, user_id, session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Updates the in-memory session (events and state) the runner is working with.
+        event = await super().append_event(session, event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_pending_check >= _EXPIRY_CHECK_SECONDS:
+                self._drop_stale_pending_locked(now)
+            _, pending, since = self._pending.get(key, (session, [], now))
+            pending.append(event)
+            self._pending[key] = (session, pending, since)
+            should_flush = len(pending) >= self.flush_events
+
+        # The turn is over once the agent's final response arrives; write it in one go.
+        if should_flush or event.is_final_response():
+            await self._flush(key)
+        return event
+
+    def discard_pending(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        """
+        Drops the events buffered for a session's current turn, e.g. when the runner
+        raised before the turn's final response, so a half-finished turn is never written.
+        """
+        with self._lock:
+            self._pending.pop((app_name, user_id, session_id), None)
+
+    async def flush(self) -> None:
+        """Writes every buffered event, e.g. before shutting down."""
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            await self._flush(key)
+
+    # --- Maintenance ---
+
+    def expire_idle_sessions(self, now: Optional[float] = None) -> int:
+        """Deletes sessions not updated for `ttl_seconds`, returning how many were deleted."""
+        cutoff = (now if now is not None else time.time()) - self.ttl_seconds
+        with self._transaction() as conn:
+            expired = conn.execute(
+                "SELECT app_name, user_id, id FROM sessions WHERE update_time < ?", (cutoff,)
+            ).fetchall()
+            for app_name, user_id, session_id in expired:
+                self._delete_rows(conn, app_name, user_id, session_id)
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        with self._connection() as conn:
+            sessions = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            events = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        with self._lock:
+            pending = sum(len(events) for _, events, _ in self._pending.values())
+        return {"sessions": sessions, "events": events, "pending_events": pending}
+
+    def close(self) -> None:
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    # --- Blocking implementation, run in worker threads ---
+
+    def _drop_stale_pending_locked(self, now: float) -> None:
+        self._last_pending_check = now
+        stale = [key for key, (_, _, since) in self._pending.items() if now - since > _PENDING_MAX_SECONDS]
+        for key in stale:
+            del self._pending[key]
+        if stale:
+            print(f"Dropped the buffered events of {len(stale)} unfinished session turns.")
+
+    def _maybe_expire(self) -> None:
+        now = time.time()
+        if now - self._last_expiry_check < _EXPIRY_CHECK_SECONDS:
+            return
+        self._last_expiry_check = now
+        self.expire_idle_sessions(now)
+
+    def _create_session(self, app_name: str, user_id: str, session_id: str, state: Dict[str, Any]) -> Session:
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+        with self._transaction() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", (app_name, user_id, session_id)
+            ).fetchone()
+            if exists:
+                raise ValueError(f"Session with id {session_id} already exists.")
+            conn.execute(
+                "INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) VALUES (?, ?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, json.dumps(session_state), now, now)
+            )
+            app_state, user_state = self._merge_shared_state(conn, app_name, user_id, app_delta, user_delta)
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=self._merged_state(app_state, user_state, session_state),
+            last_update_time=now
+        )
+
+    def _get_session(
+        self, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig]
+    ) -> Optional[Session]:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id)
+            ).fetchone()
+            if row is None:
+                return None
+
+            limit = self.max_events
+            if config is not None and config.num_recent_events is not None:
+                limit = min(limit, config.num_recent_events)
+            after = config.after_timestamp if config is not None and config.after_timestamp is not None else 0.0
+            rows = conn.execute(
+                "SELECT author, data FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND timestamp >= ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (app_name, user_id, session_id, after, limit)
+            ).fetchall() if limit > 0 else []
+            app_state = self._load_state(conn, "SELECT state FROM app_states WHERE app_name = ?", (app_name,))
+            user_state = self._load_state(
+                conn, "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            )
+
+        rows.reverse()
+        if len(rows) == self.max_events:
+            # A truncated history starts at a user message, so no function response
+            # is sent to the model without the call that produced it.
+            first_user = next((i for i, (author, _) in enumerate(rows) if author == "user"), len(rows))
+            rows = rows[first_user:]
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=self._merged_state(app_state, user_state, json.loads(row[0])),
+            events=[Event.model_validate_json(data) for _, data in rows],
+            last_update_time=row[1]
+        )
+
+    def _list_sessions(self, app_name: str, user_id: Optional[str]) -> ListSessionsResponse:
+        query = "SELECT user_id, id, update_time FROM sessions WHERE app_name = ?"
+        params: Tuple[Any, ...] = (app_name,)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params += (user_id,)
+        with self._connection() as conn:
+            rows = conn.execute(query + " ORDER BY update_time", params).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=row_user_id, id=session_id, last_update_time=update_time)
+            for row_user_id, session_id, update_time in rows
+        ])
+
+    def _delete_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        with self._transaction() as conn:
+            self._delete_rows(conn, app_name, user_id, session_id)
+
+    async def _flush(self, key: SessionKey) -> None:
+        with self._lock:
+            session, events, _ = self._pending.pop(key, (None, [], 0.0))
+        if events:
+            await asyncio.to_thread(self._write_events, session, events)
+
+    def _write_events(self, session: Session, events: List[Event]) -> None:
+        app_state, user_state, session_state = _split_state(session.state)
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE sessions SET state = ?, update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                (json.dumps(session_state), session.last_update_time, session.app_name, session.user_id, session.id)
+            )
+            if updated.rowcount == 0:
+                # Deleted or expired while the turn was running.
+                return
+            conn.executemany(
+                "INSERT INTO events (app_name, user_id, session_id, author, timestamp, data) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (session.app_name, session.user_id, session.id, event.author, event.timestamp,
+                     event.model_dump_json(exclude_none=True))
+                    for event in events
+                ]
+            )
+            self._merge_shared_state(conn, session.app_name, session.user_id, app_state, user_state)
+            self._trim_events(conn, session.app_name, session.user_id, session.id)
+
+    def _trim_events(self, conn: sqlite3.Connection, app_name: str, user_id: str, session_id: str) -> None:
+        # Keep the newest `max_events` events, cutting at the first user message among them.
+        cutoff = conn.execute(
+            "SELECT seq FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? "
+            "ORDER BY seq DESC LIMIT 1 OFFSET ?",
+            (app_name, user_id, session_id, self.max_events - 1)
+        ).fetchone()
+        if cutoff is None:
+            return
+        first_user = conn.execute(
+            "SELECT MIN(seq) FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq >= ? AND author = 'user'",
+            (app_name, user_id, session_id, cutoff[0])
+        ).fetchone()[0]
+        conn.execute(
+            "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ? AND seq < ?",
+            (app_name, user_id, session_id, first_user if first_user is not None else cutoff[0])
+        )
+
+    def _delete_rows(self, conn: sqlite3.Connection, app_name: str, user_id: str, session_id: str) -> None:
+        conn.execute("DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?", (app_name, user_id, session_id))
+        conn.execute("DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?", (app_name, user_id, session_id))
+
+    def _merge_shared_state(
+        self,
+        conn: sqlite3.Connection,
+        app_name: str,
+        user_id: str,
+        app_delta: Dict[str, Any],
+        user_delta: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        app_state = self._load_state(conn, "SELECT state FROM app_states WHERE app_name = ?", (app_name,))
+        user_state = self._load_state(
+            conn, "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        )
+        if app_delta:
+            app_state.update(app_delta)
+            conn.execute(
+                "INSERT OR REPLACE INTO app_states (app_name, state) VALUES (?, ?)", (app_name, json.dumps(app_state))
+            )
+        if user_delta:
+            user_state.update(user_delta)
+            conn.execute(
+                "INSERT OR REPLACE INTO user_states (app_name, user_id, state) VALUES (?, ?, ?)",
+                (app_name, user_id, json.dumps(user_state))
+            )
+        return app_state, user_state
+
+    @staticmethod
+    def _load_state(conn: sqlite3.Connection, query: str, params: Tuple[Any, ...]) -> Dict[str, Any]:
+        row = conn.execute(query, params).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    @staticmethod
+    def _merged_state(app_state: Dict[str, Any], user_state: Dict[str, Any], session_state: Dict[str, Any]) -> Dict[str, Any]:
+        state = dict(session_state)
+        state.update({State.APP_PREFIX + key: value for key, value in app_state.items()})
+        state.update({State.USER_PREFIX + key: value for key, value in user_state.items()})
+        return state
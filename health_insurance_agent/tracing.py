@@ -0,0 +1,364 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+
+# --- Tracing ---
+#
+# A minimal, dependency-free tracer. Spans nest through a context variable, so
+# a span opened inside a tool becomes a child of that tool's span, which is a
+# child of the agent turn. Functions handed to worker threads keep their parent
+# span when wrapped with `bind`.
+#
+# When the root span of a trace ends (normally one agent turn), the whole trace
+# is appended to `TRACE_FILE` as one line of OTLP/JSON (an
+# ExportTraceServiceRequest, as written by the OpenTelemetry collector's file
+# exporter), and a per-turn latency summary is computed from its spans.
+
+TRACING_ENABLED = os.environ.get("RAG_TRACING", "1") != "0"
+TRACE_FILE = os.environ.get("RAG_TRACE_FILE", "")
+SERVICE_NAME = os.environ.get("RAG_TRACE_SERVICE_NAME", "health-insurance-agent")
+# Recent turn durations kept for latency percentiles.
+TURN_HISTORY = int(os.environ.get("RAG_TRACE_TURN_HISTORY", 1000))
+
+# Name of the root span opened around each agent turn by the apps.
+TURN_SPAN = "agent.turn"
+
+_SPAN_KIND_INTERNAL = 1
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("rag_current_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes, belonging to a trace."""
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        # Set on root spans when they end: see `summarize`.
+        self.summary: Optional[Dict[str, Any]] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _tracer.finish(self)
+
+
+class _NoopSpan(Span):
+    """Stands in for spans when tracing is disabled, so call sites need no checks."""
+
+    def __init__(self):
+        self.name = ""
+        self.attributes = {}
+        self.summary = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes: Any) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, (int, np.integer)):
+        return {"intValue": str(int(value))}
+    if isinstance(value, (float, np.floating)):
+        return {"doubleValue": float(value)}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": _SPAN_KIND_INTERNAL,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        "status": {"code": _STATUS_ERROR, "message": span.error} if span.error else {"code": _STATUS_OK}
+    }
+    if span.parent is not None:
+        otlp["parentSpanId"] = span.parent.span_id
+    return otlp
+
+
+def summarize(spans: List[Span]) -> Dict[str, Any]:
+    """
+    Summarises a finished trace: total duration, and the count and total time of
+    spans by name (e.g. how many LLM calls the turn made and how long they took).
+    """
+    roots = [span for span in spans if span.parent is None]
+    by_name: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        if span.parent is None:
+            continue
+        entry = by_name.setdefault(span.name, {"count": 0, "total_ms": 0.0, "errors": 0})
+        entry["count"] += 1
+        entry["total_ms"] += span.duration_ms
+        entry["errors"] += 1 if span.error else 0
+    root = roots[0] if roots else spans[-1]
+    return {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "duration_ms": root.duration_ms,
+        "attributes": dict(root.attributes),
+        "spans": by_name
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """Renders a trace summary as one log line, slowest span names first."""
+    parts = [
+        f"{name} {entry['total_ms']:.0f}ms" + (f" x{entry['count']}" if entry["count"] > 1 else "")
+        for name, entry in sorted(summary["spans"].items(), key=lambda item: -item[1]["total_ms"])
+    ]
+    first_token = summary["attributes"].get("first_token_ms")
+    if first_token is not None:
+        parts.insert(0, f"first token {first_token:.0f}ms")
+    return f"[trace {summary['trace_id'][:8]}] {summary['name']} {summary['duration_ms']:.0f}ms: " + ", ".join(parts)
+
+
+class _Tracer:
+    def __init__(self, trace_file: str = TRACE_FILE):
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        # trace id -> finished spans of traces whose root is still open
+        self._open_traces: Dict[str, List[Span]] = {}
+        self._turn_durations: Deque[float] = deque(maxlen=TURN_HISTORY)
+        # Recently exported traces, so spans outliving their root (e.g. a shared
+        # document build after the turn that started it was cancelled) are dropped.
+        self._closed_traces: Deque[str] = deque(maxlen=1024)
+        self.last_summary: Optional[Dict[str, Any]] = None
+
+    def finish(self, span: Span) -> None:
+        with self._lock:
+            if span.trace_id in self._closed_traces:
+                return
+            spans = self._open_traces.setdefault(span.trace_id, [])
+            spans.append(span)
+            if span.parent is not None:
+                return
+            del self._open_traces[span.trace_id]
+            self._closed_traces.append(span.trace_id)
+            summary = summarize(spans)
+            span.summary = summary
+            self.last_summary = summary
+            if span.name == TURN_SPAN:
+                self._turn_durations.append(summary["duration_ms"])
+            if self.trace_file:
+                self._export_locked(spans)
+        _discard_open_spans(span.trace_id)
+
+    def _export_locked(self, spans: List[Span]) -> None:
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "health_insurance_agent.tracing"},
+                    "spans": [_otlp_span(span) for span in spans]
+                }]
+            }]
+        }
+        try:
+            with open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request) + "\n")
+        except OSError as e:
+            print(f"Error writing trace to {self.trace_file}: {e}")
+
+    def turn_latency(self) -> Dict[str, float]:
+        with self._lock:
+            durations = list(self._turn_durations)
+        if not durations:
+            return {"turns": 0}
+        return {
+            "turns": len(durations),
+            "p50_ms": float(np.percentile(durations, 50)),
+            "p95_ms": float(np.percentile(durations, 95)),
+            "p99_ms": float(np.percentile(durations, 99)),
+            "max_ms": float(max(durations))
+        }
+
+
+_tracer = _Tracer()
+
+
+def start_span(name: str, **attributes: Any) -> Span:
+    """Starts a child of the current span (or a new trace) without making it current."""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return Span(name, _current_span.get(), attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Runs a block inside a new span, which is current for the duration of the block."""
+    if not TRACING_ENABLED:
+        yield _NOOP_SPAN
+        return
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # A span held open across `yield` in an async generator (e.g. a streamed
+            # turn) may be closed from a different context than it was opened in.
+            _current_span.set(current.parent)
+        current.end()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def bind(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps `func` to run in the caller's tracing context. `loop.run_in_executor`
+    does not copy context variables, so without this, spans opened in worker
+    threads would start new traces.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def turn_latency() -> Dict[str, float]:
+    """Percentiles of recent agent turn durations, for SLO tracking."""
+    return _tracer.turn_latency()
+
+
+def last_summary() -> Optional[Dict[str, Any]]:
+    """Summary of the most recently finished trace."""
+    return _tracer.last_summary
+
+
+# --- ADK callbacks ---
+#
+# Registered on the root agent to open a span for every LLM call and every
+# tool invocation. ADK runs each before/after pair in the same task, so the
+# span can be made current in the "before" callback and closed in the "after".
+# A call that raises skips its "after" callback; the "on error" callback records
+# the error and closes the span instead, so later calls are not nested under it.
+
+_open_spans: Dict[Any, Span] = {}
+_open_spans_lock = threading.Lock()
+
+
+def _open(key: Any, name: str, **attributes: Any) -> None:
+    if not TRACING_ENABLED:
+        return
+    opened = Span(name, _current_span.get(), attributes)
+    _current_span.set(opened)
+    with _open_spans_lock:
+        _open_spans[key] = opened
+
+
+def _close(key: Any, **attributes: Any) -> None:
+    with _open_spans_lock:
+        opened = _open_spans.pop(key, None)
+    if opened is None:
+        return
+    opened.set_attributes(**{k: v for k, v in attributes.items() if v is not None})
+    if _current_span.get() is opened:
+        _current_span.set(opened.parent)
+    opened.end()
+
+
+def _fail(key: Any, error: BaseException) -> None:
+    with _open_spans_lock:
+        opened = _open_spans.get(key)
+    if opened is not None:
+        opened.record_error(error)
+    _close(key)
+
+
+def _discard_open_spans(trace_id: str) -> None:
+    # LLM or tool calls cancelled mid-turn reach neither their "after" nor their "on error" callback.
+    with _open_spans_lock:
+        for key in [key for key, opened in _open_spans.items() if opened.trace_id == trace_id]:
+            del _open_spans[key]
+
+
+def before_model_callback(callback_context: Any, llm_request: Any) -> None:
+    _open(("llm", callback_context.invocation_id), "llm.call", model=getattr(llm_request, "model", None) or "")
+    return None
+
+
+def after_model_callback(callback_context: Any, llm_response: Any) -> None:
+    # Streaming responses arrive in parts; the call is over with the final, non-partial one.
+    if getattr(llm_response, "partial", False):
+        return None
+    usage = getattr(llm_response, "usage_metadata", None)
+    _close(
+        ("llm", callback_context.invocation_id),
+        prompt_tokens=getattr(usage, "prompt_token_count", None),
+        output_tokens=getattr(usage, "candidates_token_count", None),
+        error=getattr(llm_response, "error_code", None)
+    )
+    return None
+
+
+def on_model_error_callback(callback_context: Any, llm_request: Any, error: Exception) -> None:
+    _fail(("llm", callback_context.invocation_id), error)
+    return None
+
+
+def before_tool_callback(tool: Any, args: Dict[str, Any], tool_context: Any) -> None:
+    _open(("tool", tool_context.function_call_id), f"tool.{tool.name}")
+    return None
+
+
+def after_tool_callback(tool: Any, args: Dict[str, Any], tool_context: Any, tool_response: Any) -> None:
+    status = tool_response.get("status") if isinstance(tool_response, dict) else None
+    _close(("tool", tool_context.function_call_id), status=status)
+    return None
+
+
+def on_tool_error_callback(tool: Any, args: Dict[str, Any], tool_context: Any, error: Exception) -> None:
+    _fail(("tool", tool_context.function_call_id), error)
+    return None